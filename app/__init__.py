@@ -1,13 +1,62 @@
 # Start Flask:
-# Import the Flask class.
-from flask import Flask
+# "importlib" package is used for importing modules by their names.
+import importlib
+from app.parameters import startup
 
-# Create an instance of the Flask class. This lets Flask find app's resources (files).
-app = Flask(__name__)
+# Modules imported by every group of create_app()'s "preload" parameter.
+# Groups which aren't preloaded are imported when they're used for the first time (e.g. "stats" when statistics are calculated).
+preload_groups = {
+    # Downloading and parsing pages of opinions.
+    "scraping": ["app.scraper", "app.streaming", "app.utils", "soupsieve"],
+    # Calculating statistics.
+    "stats": ["pandas", "numpy"],
+    # Drawing charts.
+    "charts": ["matplotlib.figure", "matplotlib.backends.backend_agg"],
+    # Reading the binary files of opinions and creating downloadable files.
+    "exports": ["app.storage", "openpyxl"],
+}
 
-# Point Flask to the module with paths to the website's template files.
-# This makes opening any of the website's pages in a web browser possible.
-from app import routes
+# The "preload" parameter is a list of groups of modules (see "preload_groups") imported right away.
+# E.g. a server starting many processes (workers) from a single process can import the modules once, before the workers are started,
+# so the workers share them instead of importing them on their own. By default, the groups listed in the "CENEO_PRELOAD"
+# environment variable are preloaded ("CENEO_PRELOAD=all" preloads every group).
+def create_app(preload=None):
+    # Import the Flask class.
+    from flask import Flask
+    # Create an instance of the Flask class. This lets Flask find app's resources (files).
+    app = Flask(__name__)
+
+    # Point Flask to the module with paths to the website's template files.
+    # This makes opening any of the website's pages in a web browser possible.
+    from app.routes import main
+    app.register_blueprint(main)
+    # Measure the time of every request (see app/metrics.py).
+    from app import metrics
+    metrics.init_app(app)
+
+    preload = startup["preload"] if preload is None else preload
+    # Check every group before importing anything, so a misspelled group (e.g. "CENEO_PRELOAD=chart") stops the app right away
+    # instead of leaving it half-preloaded.
+    unknown = [group for group in preload if group != "all" and group not in preload_groups]
+    if unknown:
+        raise ValueError(f"Unknown preload group(s): {', '.join(unknown)}. Available groups: {', '.join(preload_groups)}, all.")
+    for group in preload_groups if "all" in preload else preload:
+        for module in preload_groups[group]:
+            try:
+                importlib.import_module(module)
+            # Optional packages (e.g. "openpyxl") don't have to be installed.
+            except ImportError:
+                pass
+    return app
+
+# The app created the first time "app.app" is used (e.g. "from app import app" in run.py), so importing a module of the package
+# (e.g. "python -m app.catalogue") doesn't create the app. "__getattr__" is called when an attribute isn't found in the module.
+def __getattr__(name):
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Redundant if you turn on debug mode with "export FLASK_ENV=development".
 # Debugging let's you make changes to the app's files without restarting the server.
@@ -0,0 +1,131 @@
+# cache.py is a module storing the cache of pages downloaded from the scraped website.
+# Pages are saved on disk (compressed), so downloading the same page twice (even in two different runs) can be avoided.
+# "gzip" package is used for compressing the saved pages.
+import gzip
+# "hashlib" package is used for turning URLs into file names.
+import hashlib
+# "json" package is used for saving the information about a page (its URL, ETag, ...).
+import json
+# "os" package is used for reading/writing to files.
+import os
+# "time" package is used for checking how old a saved page is.
+import time
+# "threading" package is used for synchronizing access to objects shared between threads.
+import threading
+# "OrderedDict" is a dictionary remembering the order in which keys were added.
+from collections import OrderedDict
+# "urldefrag" removes the fragment (e.g. "#tab=reviews") from a URL. The fragment is never sent to the website.
+from urllib.parse import urldefrag
+from app.utils import atomic_path
+
+# Class representation of a single saved page.
+class CachedPage():
+    def __init__(self, url, body, etag=None, last_modified=None, fetched=0):
+        self.url = url
+        self.body = body
+        # "ETag" and "Last-Modified" headers sent by the website. They are sent back to ask if the page has changed.
+        self.etag = etag
+        self.last_modified = last_modified
+        # When the page was downloaded (or confirmed to be unchanged) for the last time.
+        self.fetched = fetched
+
+    def is_fresh(self, ttl):
+        # Return True if the page is young enough to be used without asking the website.
+        return time.time() - self.fetched < ttl
+
+    def conditional_headers(self):
+        # Return the headers asking the website to send the page only if it has changed.
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+class ResponseCache():
+    def __init__(self, directory, ttl, max_size):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        # Saved pages, from the least to the most recently used. Keys are file names, values are file sizes (in bytes).
+        # The dictionary is filled the first time the cache is used.
+        self.index = None
+        self.size = 0
+        self.lock = threading.Lock()
+        # "hits" - pages used without asking the website, "revalidations" - pages confirmed to be unchanged by the website,
+        # "misses" - pages which had to be downloaded, "evictions" - pages removed to keep the cache small.
+        self.stats = {"hits": 0, "revalidations": 0, "misses": 0, "evictions": 0}
+
+    def key(self, url):
+        # Return the name of the file storing the page found at the passed URL.
+        return hashlib.sha256(urldefrag(url)[0].encode("UTF-8")).hexdigest() + ".gz"
+
+    def load_index(self):
+        # Fill the index with every file in the cache directory, from the least to the most recently used.
+        if self.index is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".gz")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self.index = OrderedDict((entry.name, entry.stat().st_size) for entry in entries)
+        self.size = sum(self.index.values())
+
+    def get(self, url):
+        # Return the saved page found at the passed URL, or None if it isn't saved.
+        key = self.key(url)
+        with self.lock:
+            self.load_index()
+            if key not in self.index:
+                return None
+            # Mark the page as the most recently used one.
+            self.index.move_to_end(key)
+        path = os.path.join(self.directory, key)
+        try:
+            # Update the file's modification time, so the order of use is remembered between runs of the app.
+            os.utime(path)
+            # Every file starts with a line of information about the page, the rest of the file is the page itself.
+            with gzip.open(path, "rt", encoding="UTF-8") as file:
+                header = json.loads(file.readline())
+                return CachedPage(body=file.read(), **header)
+        # If the file was removed (or damaged) in the meantime, treat the page as not saved.
+        except (OSError, ValueError, EOFError):
+            return None
+
+    def put(self, page):
+        # Save the page (compressed) and remove the least recently used pages if the cache got too big.
+        key = self.key(page.url)
+        path = os.path.join(self.directory, key)
+        header = {"url": page.url, "etag": page.etag, "last_modified": page.last_modified, "fetched": page.fetched}
+        with self.lock:
+            self.load_index()
+            # Write to a temporary file first and then replace the old file, so other threads (and processes) never read a half-written file.
+            with atomic_path(path) as temporary_path:
+                with gzip.open(temporary_path, "wt", encoding="UTF-8") as file:
+                    file.write(json.dumps(header) + "\n")
+                    file.write(page.body)
+            self.size -= self.index.pop(key, 0)
+            self.index[key] = os.path.getsize(path)
+            self.size += self.index[key]
+            self.evict()
+
+    def refresh(self, page):
+        # Mark the saved page as confirmed to be unchanged right now.
+        page.fetched = time.time()
+        self.put(page)
+
+    def evict(self):
+        # Remove the least recently used pages until the cache is small enough.
+        # Called only while holding the lock.
+        while self.size > self.max_size and self.index:
+            key, size = self.index.popitem(last=False)
+            self.size -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(os.path.join(self.directory, key))
+            except FileNotFoundError:
+                pass
+
+    def count(self, name):
+        # Increase the passed counter by one.
+        with self.lock:
+            self.stats[name] += 1
@@ -0,0 +1,221 @@
+# catalogue.py is a module storing functions used for working with the catalogue of products:
+# an SQLite database with statistics of every extracted product. Thanks to it, the /products page doesn't have to open
+# a .json file of every product, only to display a single page of them.
+# "sqlite3" package is Python's built-in SQLite database library.
+import sqlite3
+# "json" package is used for working with .json files.
+import json
+# "os" package is used for reading/writing to files.
+import os
+# "time" package is used for remembering when jobs were saved.
+import time
+# "closing" makes sure that a database connection is closed after a "with" statement.
+from contextlib import closing
+from app.parameters import catalogue
+
+# Columns of the "opinions" table which opinions can be sorted by.
+opinion_sort_columns = ["position", "stars", "useful", "useless", "published"]
+# Filters of opinions. Keys are the names of the filters, values are the conditions (SQL code) an opinion must meet.
+opinion_filters = {
+    "recommended": "recommendation = 'Polecam'",
+    "not_recommended": "recommendation = 'Nie polecam'",
+    "no_recommendation": "recommendation IS NULL",
+    "with_pros": "pros_count > 0",
+    "with_cons": "cons_count > 0",
+}
+
+# Paths of catalogues already prepared (tables and indexes created) by this process.
+_prepared = set()
+
+# Columns of the "products" table, in the same order as the keys of the dictionary returned by Product.stats_to_dict().
+columns = ["product_id", "product_name", "opinions_count", "pros_count", "cons_count", "average_score"]
+# Columns of the "jobs" table, in the same order as the keys of the dictionary returned by Job.to_dict() (see app/jobs.py).
+job_columns = ["job_id", "product_id", "incremental", "stage", "pages_fetched", "opinions_parsed", "error"]
+# Stages of jobs which are finished.
+finished_stages = ("done", "failed")
+
+def connect():
+    # Return a connection to the catalogue, creating the catalogue if it doesn't exist yet.
+    new = not os.path.exists(catalogue["path"])
+    os.makedirs(os.path.dirname(catalogue["path"]), exist_ok=True)
+    connection = sqlite3.connect(catalogue["path"], timeout=30)
+    # Return rows as sqlite3.Row objects, which can be turned into dictionaries.
+    connection.row_factory = sqlite3.Row
+    # Tables and indexes have to be created only once.
+    if not new and catalogue["path"] in _prepared:
+        return connection
+    # "WAL" mode lets the catalogue be read while it's being written to (e.g. by a background extraction).
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            product_id TEXT PRIMARY KEY,
+            product_name TEXT,
+            opinions_count INTEGER,
+            pros_count INTEGER,
+            cons_count INTEGER,
+            average_score REAL
+        )""")
+    # Indexes make sorting by these columns fast.
+    for column in columns[1:]:
+        connection.execute(f"CREATE INDEX IF NOT EXISTS products_{column} ON products ({column})")
+    # The index of opinions: the values opinions can be sorted and filtered by, and the place of every opinion
+    # in the product's .json file ("start" - the number of the opinion's first byte, "length" - the amount of the opinion's bytes),
+    # so a single opinion can be read without reading the whole file.
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS opinions (
+            product_id TEXT,
+            position INTEGER,
+            opinion_id TEXT,
+            recommendation TEXT,
+            stars REAL,
+            useful INTEGER,
+            useless INTEGER,
+            published TEXT,
+            pros_count INTEGER,
+            cons_count INTEGER,
+            start INTEGER,
+            length INTEGER,
+            PRIMARY KEY (product_id, position)
+        )""")
+    for column in opinion_sort_columns:
+        connection.execute(f"CREATE INDEX IF NOT EXISTS opinions_{column} ON opinions (product_id, {column})")
+    # The modification time of every indexed .json file. If the file changes, its index is out of date.
+    connection.execute("CREATE TABLE IF NOT EXISTS opinion_files (product_id TEXT PRIMARY KEY, modified INTEGER)")
+    # Extraction jobs (see app/jobs.py). They're saved in the catalogue, so a job started by one process of the app
+    # can be checked by every other process. "updated" is the last time the process running the job saved its progress.
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            product_id TEXT,
+            incremental INTEGER,
+            stage TEXT,
+            pages_fetched INTEGER,
+            opinions_parsed INTEGER,
+            error TEXT,
+            created REAL,
+            updated REAL
+        )""")
+    connection.execute("CREATE INDEX IF NOT EXISTS jobs_product_id ON jobs (product_id, stage)")
+    connection.execute("CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created)")
+    # A new catalogue is filled with the products extracted before the catalogue existed.
+    if new:
+        migrate(connection)
+    _prepared.add(catalogue["path"])
+    return connection
+
+def migrate(connection):
+    # Add every product found in the app/products directory to the catalogue.
+    if not os.path.exists("app/products"):
+        return 0
+    products = []
+    for filename in os.listdir("app/products"):
+        if filename.endswith(".json"):
+            with open(f"app/products/{filename}", "r", encoding="UTF-8") as jf:
+                products.append(json.load(jf))
+    with connection:
+        connection.executemany(f"INSERT OR REPLACE INTO products VALUES ({', '.join('?' * len(columns))})",
+                               [[product.get(column) for column in columns] for product in products])
+    return len(products)
+
+def save_product(stats):
+    # Add a product to the catalogue (or update it, if it's already there).
+    # The "stats" parameter is a dictionary returned by Product.stats_to_dict().
+    # "with connection" commits the changes to the database at the end of the "with" statement.
+    with closing(connect()) as connection, connection:
+        connection.execute(f"INSERT OR REPLACE INTO products VALUES ({', '.join('?' * len(columns))})",
+                           [stats[column] for column in columns])
+
+def find_products(query="", sort="product_id", descending=False, offset=0, limit=None):
+    # Return a list of dictionaries of products' statistics and the amount of every product matching the query.
+    # Only the requested page of products is read from the database.
+    # "query" is a part of the product's ID or name, "sort" is the name of the column the products are sorted by.
+    # If the column doesn't exist, products are sorted by their IDs (the name can't be passed to the database as is, it's a part of the SQL code).
+    sort = sort if sort in columns else "product_id"
+    order = "DESC" if descending else "ASC"
+    condition = "product_id LIKE :query OR product_name LIKE :query"
+    parameters = {"query": f"%{query}%", "offset": offset, "limit": limit or catalogue["per_page"]}
+    with closing(connect()) as connection:
+        total = connection.execute(f"SELECT COUNT(*) FROM products WHERE {condition}", parameters).fetchone()[0]
+        rows = connection.execute(f"SELECT * FROM products WHERE {condition} ORDER BY {sort} {order}, product_id LIMIT :limit OFFSET :offset", parameters)
+        return [dict(row) for row in rows], total
+
+def index_opinions(product_id, modified, rows):
+    # Replace the index of the product's opinions. "modified" is the modification time of the product's .json file,
+    # "rows" is a list of dictionaries with the values of the columns of the "opinions" table.
+    with closing(connect()) as connection, connection:
+        connection.execute("DELETE FROM opinions WHERE product_id = ?", [product_id])
+        connection.executemany("""
+            INSERT INTO opinions VALUES (:product_id, :position, :opinion_id, :recommendation, :stars, :useful, :useless,
+                                         :published, :pros_count, :cons_count, :start, :length)""", rows)
+        connection.execute("INSERT OR REPLACE INTO opinion_files VALUES (?, ?)", [product_id, modified])
+
+def indexed_modified(product_id):
+    # Return the modification time of the product's .json file at the time it was indexed (None if it wasn't indexed).
+    with closing(connect()) as connection:
+        row = connection.execute("SELECT modified FROM opinion_files WHERE product_id = ?", [product_id]).fetchone()
+        return row[0] if row else None
+
+def find_opinions(product_id, sort="position", descending=False, filter=None, offset=0, limit=20):
+    # Return a list of (start, length) tuples of the requested page of the product's opinions, the amount of every opinion matching the filter
+    # and the modification time of the .json file the opinions were indexed from (None if they weren't indexed).
+    # Sorting by an unknown column sorts by the opinion's position in the .json file, an unknown filter raises a KeyError.
+    sort = sort if sort in opinion_sort_columns else "position"
+    order = "DESC" if descending else "ASC"
+    condition = "product_id = :product_id" + (f" AND {opinion_filters[filter]}" if filter else "")
+    parameters = {"product_id": product_id, "offset": offset, "limit": limit}
+    with closing(connect()) as connection, connection:
+        # Every value is read in a single transaction, so they all come from the same version of the index.
+        connection.execute("BEGIN")
+        total = connection.execute(f"SELECT COUNT(*) FROM opinions WHERE {condition}", parameters).fetchone()[0]
+        rows = connection.execute(f"SELECT start, length FROM opinions WHERE {condition} ORDER BY {sort} {order}, position LIMIT :limit OFFSET :offset", parameters)
+        places = [tuple(row) for row in rows]
+        row = connection.execute("SELECT modified FROM opinion_files WHERE product_id = ?", [product_id]).fetchone()
+        return places, total, row[0] if row else None
+
+def job_to_dict(row, stale_after):
+    # Return a dictionary of a row of the "jobs" table.
+    job = {column: row[column] for column in job_columns}
+    job["incremental"] = bool(job["incremental"])
+    # A job which isn't finished, but whose progress wasn't saved for "stale_after" seconds, was stopped (e.g. its process was killed).
+    if job["stage"] not in finished_stages and time.time() - row["updated"] > stale_after:
+        job["stage"] = "failed"
+        job["error"] = "The process running the job stopped."
+    return job
+
+def add_job(job, stale_after, history):
+    # Save a new job (a dictionary returned by Job.to_dict()), unless the same product is already being extracted by a job
+    # whose progress was saved in the last "stale_after" seconds. Returns the dictionary of that job, or None if the new job was saved.
+    # Only the newest "history" jobs are kept.
+    now = time.time()
+    with closing(connect()) as connection, connection:
+        # "BEGIN IMMEDIATE" locks the catalogue for writing right away, so two processes can't both add a job of the same product.
+        connection.execute("BEGIN IMMEDIATE")
+        row = connection.execute(f"""
+            SELECT * FROM jobs WHERE product_id = ? AND stage NOT IN {finished_stages} AND updated > ?
+            ORDER BY created DESC LIMIT 1""", [job["product_id"], now - stale_after]).fetchone()
+        if row is not None:
+            return job_to_dict(row, stale_after)
+        connection.execute(f"INSERT INTO jobs VALUES ({', '.join('?' * (len(job_columns) + 2))})",
+                           [job[column] for column in job_columns] + [now, now])
+        connection.execute("DELETE FROM jobs WHERE job_id NOT IN (SELECT job_id FROM jobs ORDER BY created DESC LIMIT ?)", [history])
+    return None
+
+def save_jobs(jobs):
+    # Save the progress of jobs (a list of dictionaries returned by Job.to_dict()).
+    # Finished jobs aren't changed, so a late save of a job's progress never overwrites its result.
+    with closing(connect()) as connection, connection:
+        connection.executemany(f"""
+            UPDATE jobs SET stage = :stage, pages_fetched = :pages_fetched, opinions_parsed = :opinions_parsed, error = :error, updated = :updated
+            WHERE job_id = :job_id AND stage NOT IN {finished_stages}""", [dict(job, updated=time.time()) for job in jobs])
+
+def find_job(job_id, stale_after):
+    # Return the dictionary of the job with the passed ID, or None if there is no such job.
+    with closing(connect()) as connection:
+        row = connection.execute("SELECT * FROM jobs WHERE job_id = ?", [job_id]).fetchone()
+        return job_to_dict(row, stale_after) if row else None
+
+# Running this module (in the ./CeneoWebScraper directory) with "python -m app.catalogue" adds every product
+# found in the app/products directory to the catalogue again.
+if __name__ == "__main__":
+    with closing(connect()) as connection:
+        print(f"{migrate(connection)} products added to the catalogue.")
@@ -0,0 +1,155 @@
+# charts.py is a module storing functions used for drawing charts of products' opinions.
+# Charts are drawn by a pool of background threads using matplotlib's Figure objects (every chart has its own Figure,
+# instead of the single global chart of "pyplot"), so charts of many products can be drawn at the same time.
+# Drawn charts are saved with a hash of the data they show in their names, so a chart is drawn again only when its data changes.
+#
+# Every product has a .json file in the app/static/plots directory with the hash of its current charts
+# and the modification time of its opinions' .json file at the time the charts were drawn.
+# "hashlib" package is used for calculating hashes of the charts' data.
+import hashlib
+# "glob" package is used for finding files matching a pattern.
+import glob
+# "json" package is used for working with .json files.
+import json
+# "os" package is used for reading/writing to files.
+import os
+# "threading" package is used for synchronizing access to objects shared between threads.
+import threading
+# "ThreadPoolExecutor" runs functions in a pool of threads.
+from concurrent.futures import ThreadPoolExecutor
+from app.parameters import charts
+from app.metrics import timed
+from app.utils import atomic_path
+
+# The directory with the charts.
+DIRECTORY = "app/static/plots"
+# The version of the charts. Changing it draws every chart again (e.g. after changing the way charts look).
+VERSION = 1
+# Labels of the recommendations (in the same order as Product.recommendations) and of the scores (0.0, 0.5, ..., 5.0).
+recommendation_labels = ["Nie polecam", "Polecam", "Nie mam zdania"]
+stars_labels = [str(score / 2) for score in range(11)]
+
+_executor = None
+# Charts being drawn at the moment. Keys are (product ID, hash) tuples, values are Future objects.
+_pending = {}
+_lock = threading.Lock()
+
+def executor():
+    # Return the pool of threads drawing charts, creating it the first time it's needed.
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=charts["workers"], thread_name_prefix="charts")
+        return _executor
+
+def chart_key(recommendations, stars):
+    # Return the hash of the charts' data. "recommendations" and "stars" are lists of amounts of opinions.
+    data = json.dumps({"version": VERSION, "formats": charts["formats"], "recommendations": recommendations, "stars": stars})
+    return hashlib.sha256(data.encode("UTF-8")).hexdigest()[:16]
+
+def chart_path(product_id, chart, key, extension):
+    return f"{DIRECTORY}/{product_id}_{chart}.{key}.{extension}"
+
+def manifest_path(product_id):
+    return f"{DIRECTORY}/{product_id}.json"
+
+def opinions_modified(product_id):
+    # Return the modification time of the product's opinions' .json file (None if it doesn't exist).
+    try:
+        return os.stat(f"app/opinions/{product_id}.json").st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def current_charts(product_id):
+    # Return a dictionary of file names of the product's charts (relative to the "static" directory) for every chart and format,
+    # e.g. {"stars": {"png": "plots/1_stars.<hash>.png", ...}, ...}, or None if the charts are missing or out of date.
+    try:
+        with open(manifest_path(product_id), "r", encoding="UTF-8") as jf:
+            manifest = json.load(jf)
+    except (FileNotFoundError, ValueError):
+        return None
+    if manifest.get("modified") != opinions_modified(product_id) or manifest.get("formats") != charts["formats"]:
+        return None
+    files = {chart: {extension: chart_path(product_id, chart, manifest["key"], extension) for extension in charts["formats"]}
+             for chart in ("recommendations", "stars")}
+    if not all(os.path.exists(path) for paths in files.values() for path in paths.values()):
+        return None
+    # "len('app/static/')" cuts "app/static/" from the paths.
+    return {chart: {extension: path[len("app/static/"):] for extension, path in paths.items()} for chart, paths in files.items()}
+
+def submit(product_id, recommendations, stars):
+    # Draw the product's charts in the background (unless they were already drawn for the same data) and return a Future object,
+    # whose result() is the value returned by current_charts(). "recommendations" and "stars" are lists of amounts of opinions.
+    key = chart_key(recommendations, stars)
+    modified = opinions_modified(product_id)
+    pool = executor()
+    # If the same charts are being drawn at the moment, wait for them instead of drawing them twice.
+    with _lock:
+        future = _pending.get((product_id, key))
+        if future is not None:
+            return future
+        future = _pending[(product_id, key)] = pool.submit(draw, product_id, key, modified, recommendations, stars)
+    future.add_done_callback(lambda _: _pending.pop((product_id, key), None))
+    return future
+
+@timed("charts")
+def draw(product_id, key, modified, recommendations, stars):
+    # Draw the charts (if they don't exist yet), remember their hash and remove the older versions of the charts.
+    os.makedirs(DIRECTORY, exist_ok=True)
+    for chart, draw_chart, data in [("recommendations", draw_recommendations, recommendations), ("stars", draw_stars, stars)]:
+        paths = {extension: chart_path(product_id, chart, key, extension) for extension in charts["formats"]}
+        if all(os.path.exists(path) for path in paths.values()):
+            continue
+        figure = draw_chart(data)
+        for extension, path in paths.items():
+            # Write to a temporary file first, so a half-written chart is never sent.
+            with atomic_path(path) as temporary_path:
+                figure.savefig(temporary_path, format=extension)
+    with atomic_path(manifest_path(product_id)) as temporary_path:
+        with open(temporary_path, "w", encoding="UTF-8") as jf:
+            json.dump({"key": key, "modified": modified, "formats": charts["formats"]}, jf)
+    remove_old_charts(product_id, key)
+    return current_charts(product_id)
+
+def remove_old_charts(product_id, key):
+    # Remove the product's charts drawn for other data.
+    for path in glob.glob(f"{DIRECTORY}/{glob.escape(product_id)}_*.*.*"):
+        if path.split(".")[-2] != key and not path.endswith(".tmp"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def new_figure():
+    # "matplotlib" takes a long time to import, so it's imported only when a chart is drawn for the first time.
+    # "Figure" is a single chart, independent of every other chart (unlike charts drawn with "pyplot").
+    from matplotlib.figure import Figure
+    return Figure()
+
+def draw_recommendations(recommendations):
+    # Return a Figure with a pie chart of the amount of each recommendation given.
+    figure = new_figure()
+    axes = figure.add_subplot()
+    # A pie chart of no opinions can't be drawn.
+    if sum(recommendations):
+        axes.pie(
+            recommendations,
+            # Generate and add percent values as labels of each wedge on the pie chart.
+            autopct = lambda p: '{:.1f}%'.format(round(p)) if p > 0 else '',
+            colors = ["crimson", "forestgreen", "lightskyblue"],
+            labels = recommendation_labels
+        )
+    axes.set_title("Rekomendacje")
+    return figure
+
+def draw_stars(stars):
+    # Return a Figure with a bar chart of the amount of each score given.
+    figure = new_figure()
+    axes = figure.add_subplot()
+    axes.bar(range(len(stars)), stars, width=0.5, color="coral")
+    axes.set_xticks(range(len(stars)), stars_labels)
+    axes.set_title("Oceny produktu")
+    axes.set_xlabel("Liczba gwiazdek")
+    axes.set_ylabel("Liczba opinii")
+    axes.grid(True, axis="y")
+    return figure
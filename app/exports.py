@@ -0,0 +1,141 @@
+# exports.py is a module storing functions used for exporting opinions about a product to downloadable files
+# (.csv, .ndjson, .xlsx and .parquet). Files are created row by row instead of building a pandas DataFrame of every opinion first,
+# and created files are saved, so the same file doesn't have to be created again until the product's opinions change.
+# "csv" package is used for writing .csv files.
+import csv
+# "glob" package is used for finding files matching a pattern.
+import glob
+# "io" package is used for working with text streams.
+import io
+# "json" package is used for working with .json files.
+import json
+# "os" package is used for reading/writing to files.
+import os
+from app.parameters import selectors, storage
+from app.utils import atomic_path
+
+# Columns of the exported files, in the same order as the keys of the dictionary returned by Opinion.to_dict().
+columns = ["opinion_id"] + list(selectors.keys())
+# Columns with numbers stored as text in the .json files. They are exported as numbers to .xlsx and .parquet files.
+numeric_columns = ("useful", "useless")
+# The amount of rows written at once (and the amount of rows in a single part of a .parquet file).
+BATCH_SIZE = 1000
+
+def opinions_path(product_id):
+    return f"app/opinions/{product_id}.json"
+
+def read_opinions(product_id):
+    # Return a generator of dictionaries of the product's opinions' attributes.
+    # The opinions are read from the .bin file, if it exists (it's much faster than reading the .json file).
+    store = None
+    if storage["binary"]:
+        # app.storage uses NumPy, which takes a long time to import, so it's imported only when opinions are read from .bin files.
+        from app.storage import read_store
+        store = read_store(product_id)
+    if store is not None:
+        with store:
+            # Every column is read (copied from the file) before the file is closed, so the file isn't kept open while the opinions
+            # are being sent (which may take a long time). Windows doesn't let a new extraction replace a file which is still open.
+            names = list(store.columns)
+            rows = store.rows(names)
+        for values in rows:
+            yield dict(zip(names, values))
+        return
+    with open(opinions_path(product_id), "r", encoding="UTF-8") as jf:
+        opinions = json.load(jf)
+    yield from opinions
+
+def to_text(value):
+    # Return a value as it's written to a .csv (or .xlsx) file: no value (None) as an empty cell, lists as Python lists (e.g. "['a', 'b']").
+    return "" if value is None else str(value)
+
+def to_number(value):
+    # Return a number stored as text (e.g. "12") as an integer, or None if it isn't a number.
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value if isinstance(value, int) else None
+
+def export_path(product_id, extension):
+    # Return the path of the saved file. The file's name contains the modification time of the product's .json file,
+    # so a new file is created every time the product's opinions change.
+    modified = os.stat(opinions_path(product_id)).st_mtime_ns
+    return f"app/exports/{product_id}.{modified}.{extension}"
+
+def save_export(path, write):
+    # Create a file using the "write" function (which takes the path of the file to write to), save it and remove older versions of the file.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first, so a half-written file is never sent.
+    with atomic_path(path) as temporary_path:
+        write(temporary_path)
+    remove_old_exports(path)
+
+def remove_old_exports(path):
+    # Remove older versions of the file (files of the same product and format with a different modification time).
+    product_id, _, extension = os.path.basename(path).split(".")
+    for old_path in glob.glob(f"app/exports/{glob.escape(product_id)}.*.{extension}"):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+
+def stream_export(path, chunks):
+    # Return a generator sending the chunks of a file as they're created and saving them to the file at the same time.
+    # If the download is interrupted, the half-written file is removed instead of being saved.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_path(path) as temporary_path:
+        with open(temporary_path, "w", encoding="UTF-8", newline="") as file:
+            for chunk in chunks:
+                file.write(chunk)
+                yield chunk
+    remove_old_exports(path)
+
+def csv_chunks(opinions):
+    # Return a generator of parts of a .csv file: the header and then BATCH_SIZE rows at a time.
+    buffer = io.StringIO()
+    # "lineterminator" is "\n", just like in .csv files created by pandas.
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for number, opinion in enumerate(opinions, 1):
+        writer.writerow([to_text(opinion.get(column)) for column in columns])
+        if number % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def ndjson_chunks(opinions):
+    # Return a generator of lines of a .ndjson file ("newline-delimited JSON"): every opinion is a JSON object in a separate line.
+    for opinion in opinions:
+        yield json.dumps({column: opinion.get(column) for column in columns}, ensure_ascii=False) + "\n"
+
+def write_xlsx(opinions, path):
+    # Write the opinions to an .xlsx file. "write_only=True" writes rows straight to the file instead of keeping the whole sheet in memory.
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(columns)
+    for opinion in opinions:
+        sheet.append([to_number(opinion.get(column)) if column in numeric_columns else to_text(opinion.get(column)) or None for column in columns])
+    workbook.save(path)
+
+def write_parquet(opinions, path):
+    # Write the opinions to a .parquet file, BATCH_SIZE rows (a "row group") at a time.
+    # "pyarrow" package isn't required by the app, so it's imported only when a .parquet file is requested.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(column, pa.list_(pa.string()) if column in ("pros", "cons") else pa.int64() if column in numeric_columns else pa.string())
+                        for column in columns])
+
+    def write_batch(writer, batch):
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for opinion in opinions:
+            batch.append({column: to_number(opinion.get(column)) if column in numeric_columns else opinion.get(column) for column in columns})
+            if len(batch) == BATCH_SIZE:
+                write_batch(writer, batch)
+                batch = []
+        if batch:
+            write_batch(writer, batch)
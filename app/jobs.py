@@ -0,0 +1,141 @@
+# jobs.py is a module storing classes used for extracting products in the background,
+# so a request to the /extract page doesn't have to wait until every opinion is downloaded.
+# "sqlite3" package is used for catching errors of the catalogue, where jobs are saved.
+import sqlite3
+# "threading" package is used for synchronizing access to objects shared between threads.
+import threading
+# "time" package is used for waiting between saves of the jobs' progress.
+import time
+# "uuid" package is used for generating unique job IDs.
+import uuid
+# "ThreadPoolExecutor" runs functions in a pool of threads.
+from concurrent.futures import ThreadPoolExecutor
+from app import catalogue
+from app.models.product import Product
+from app.parameters import jobs
+from app.metrics import counter
+
+# The amount of finished jobs, by their result ("done" or "failed").
+finished_jobs = counter("ceneo_jobs_total", "Finished extraction jobs.", ("result",))
+
+# Class representation of a single extraction of a product.
+class Job():
+    # "incremental=True" means that only the opinions posted since the last extraction are downloaded.
+    def __init__(self, product_id, incremental=False):
+        self.job_id = uuid.uuid4().hex
+        self.product_id = product_id
+        self.incremental = incremental
+        self.product = Product(product_id)
+        # The stage of the extraction: "queued", "name", "opinions", "stats", "export", "charts", "done" or "failed".
+        self.stage = "queued"
+        self.error = None
+
+    def to_dict(self):
+        # Return a dictionary describing the progress of the job.
+        return {
+            "job_id": self.job_id,
+            "product_id": self.product_id,
+            "incremental": self.incremental,
+            "stage": self.stage,
+            "pages_fetched": self.product.pages_fetched,
+            "opinions_parsed": self.product.opinions_extracted,
+            "error": self.error
+        }
+
+    def run(self):
+        try:
+            # Extract the product's name from the scraped website.
+            self.stage = "name"
+            self.product.extract_name()
+            # If the product name does NOT exist, the input product ID doesn't point to an actual product on the scraped website.
+            if not self.product.product_name:
+                self.stage = "failed"
+                self.error = "Darn it! This product ID does not exist, bucko!"
+                return
+            # Extract opinions about the product, calculate statistics based on the opinions and create charts and graphs based on the statistics.
+            self.stage = "opinions"
+            if self.incremental:
+                # Statistics are updated while adding the new opinions to the stored ones.
+                self.product.extract_new_opinions()
+            else:
+                self.product.extract_opinions()
+                self.stage = "stats"
+                self.product.calculate_stats()
+            # Save the product's opinions and information to .json files.
+            self.stage = "export"
+            self.product.export_opinions()
+            self.product.export_product()
+            # Wait until the charts are drawn by the pool of threads drawing charts.
+            self.stage = "charts"
+            self.product.draw_charts().result()
+            self.stage = "done"
+        # If anything went wrong, remember the error instead of losing it in the background thread.
+        except Exception as error:
+            self.stage = "failed"
+            self.error = f"{type(error).__name__}: {error}"
+        finally:
+            finished_jobs.add(1, self.stage)
+
+# A queue of jobs run by a pool of background threads.
+# Jobs are saved in the catalogue (see app/catalogue.py), so when the app runs in many processes (e.g. gunicorn's workers),
+# a job started by one process can be checked by every other process, and a product is never extracted by two processes at once.
+class JobQueue():
+    def __init__(self, workers=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers or jobs["workers"])
+        # Jobs of this process which are queued or running. Keys are product IDs, values are Job objects.
+        self.active = {}
+        self.lock = threading.Lock()
+        # The thread saving the progress of the jobs, started when the first job is submitted.
+        self.saver = None
+
+    def submit(self, product_id, incremental=False):
+        # Start a job and return its dictionary (see Job.to_dict()). If the product is already being extracted
+        # (by this or any other process), return the dictionary of the existing job instead of extracting the product twice.
+        with self.lock:
+            if product_id in self.active:
+                return self.active[product_id].to_dict()
+            job = Job(product_id, incremental)
+            existing = catalogue.add_job(job.to_dict(), jobs["stale_after"], jobs["history"])
+            if existing is not None:
+                return existing
+            self.active[product_id] = job
+            if self.saver is None:
+                self.saver = threading.Thread(target=self.save_progress, daemon=True, name="jobs")
+                self.saver.start()
+        self.executor.submit(self.run, job)
+        return job.to_dict()
+
+    def run(self, job):
+        try:
+            job.run()
+        finally:
+            # Save the result of the job. The job has finished, so the next submit of the same product starts a new job.
+            catalogue.save_jobs([job.to_dict()])
+            with self.lock:
+                self.active.pop(job.product_id, None)
+
+    def save_progress(self):
+        # Save the progress of every queued or running job of this process every "progress_interval" seconds.
+        # This also shows other processes that the jobs are still running (see the "stale_after" setting).
+        while True:
+            time.sleep(jobs["progress_interval"])
+            with self.lock:
+                active = [job.to_dict() for job in self.active.values()]
+            if active:
+                try:
+                    catalogue.save_jobs(active)
+                # If the catalogue is busy, the progress is saved next time.
+                except sqlite3.Error:
+                    pass
+
+    def get(self, job_id):
+        # Return the dictionary of the job with the passed ID (see Job.to_dict()), or None if there is no such job.
+        # Jobs running in this process are read directly, so their progress is always up to date.
+        with self.lock:
+            for job in self.active.values():
+                if job.job_id == job_id:
+                    return job.to_dict()
+        return catalogue.find_job(job_id, jobs["stale_after"])
+
+# The queue used by the app's routes.
+queue = JobQueue()
@@ -0,0 +1,208 @@
+# metrics.py is a module storing counters and histograms measuring the app: how long every stage of an extraction
+# and every page takes, how much is downloaded, how many pages and opinions every extraction finds and how often cached pages are used.
+# The /metrics page returns them in the Prometheus text format (https://prometheus.io/docs/instrumenting/exposition_formats/),
+# so they can be collected by Prometheus (or simply read in a web browser).
+#
+# A single request can also be profiled: if the "CENEO_PROFILE_TOKEN" environment variable is set, a request with
+# the "X-Profile" header equal to it returns a summary of the time spent in every function (by cProfile) instead of the page.
+# "bisect" package is used for finding the bucket of a histogram a value belongs to.
+import bisect
+# "io" package is used for writing the profiling summary to a string.
+import io
+# "sys" package is used for checking which modules were already imported.
+import sys
+# "time" package is used for measuring how long things take.
+import time
+# "threading" package is used for synchronizing access to objects shared between threads.
+import threading
+# "wraps" copies the name (and other attributes) of a function to the function replacing it.
+from functools import wraps
+from app.parameters import metrics as metrics_parameters
+
+# Upper bounds of the buckets of histograms of times (in seconds) and of amounts (e.g. of pages).
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+AMOUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+# Every metric, in the order they were created. Keys are the names of the metrics.
+_metrics = {}
+_lock = threading.Lock()
+
+def format_labels(names, values):
+    # Return labels in the Prometheus format, e.g. '{stage="stats"}' (or "" if there are no labels).
+    if not names:
+        return ""
+    escaped = [str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+# A value which only grows, e.g. the amount of downloaded bytes. "labels" are the names of the labels of the counter,
+# e.g. counter.add(1, "hits") for a counter with labels=("result",).
+class Counter():
+    kind = "counter"
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        # Keys are tuples of values of the labels.
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def add(self, amount=1, *labels):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def lines(self):
+        with self.lock:
+            values = dict(self.values)
+        return [f"{self.name}{format_labels(self.labels, labels)} {value}" for labels, value in values.items()]
+
+# The amount of observed values falling into every bucket, together with their sum, e.g. the times of every request to a page.
+class Histogram():
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # Keys are tuples of values of the labels, values are lists: the amount of values in every bucket
+        # (the last bucket is for values larger than every bound), the sum and the amount of every value.
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self.lock:
+            if labels not in self.values:
+                self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = self.values[labels]
+            # "bisect_left" returns the number of the first bucket with a bound larger than or equal to the value.
+            counts[0][bisect.bisect_left(self.buckets, value)] += 1
+            counts[1] += value
+            counts[2] += 1
+
+    def time(self, *labels):
+        # Return a context manager measuring the time of the code in a "with" statement.
+        return Timer(self, labels)
+
+    def lines(self):
+        with self.lock:
+            values = {labels: (list(counts), total, amount) for labels, (counts, total, amount) in self.values.items()}
+        lines = []
+        for labels, (counts, total, amount) in values.items():
+            # Buckets of Prometheus histograms are cumulative: every bucket counts the values smaller than or equal to its bound.
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {amount}")
+        return lines
+
+class Timer():
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+def register(metric):
+    # Remember the metric (or return the metric with the same name created before) and return it.
+    with _lock:
+        return _metrics.setdefault(metric.name, metric)
+
+def counter(name, description, labels=()):
+    return register(Counter(name, description, labels))
+
+def histogram(name, description, labels=(), buckets=TIME_BUCKETS):
+    return register(Histogram(name, description, labels, buckets))
+
+# The metrics measured by the app.
+stage_seconds = histogram("ceneo_stage_seconds", "Time of a stage of extracting a product.", ("stage",))
+route_seconds = histogram("ceneo_route_seconds", "Time of handling a request to a page of the app.", ("route", "method", "status"))
+request_seconds = histogram("ceneo_request_seconds", "Time of a single request to the scraped website.")
+parse_seconds = histogram("ceneo_parse_seconds", "Time of parsing a single page of opinions.")
+scrape_pages = histogram("ceneo_scrape_pages", "Pages of opinions downloaded by a single extraction.", buckets=AMOUNT_BUCKETS)
+scrape_opinions = histogram("ceneo_scrape_opinions", "Opinions found by a single extraction.", buckets=AMOUNT_BUCKETS)
+
+def timed(stage):
+    # Return a decorator measuring the time of every call of a function as the passed stage, e.g. "@timed('stats')".
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*arguments, **keyword_arguments):
+            with stage_seconds.time(stage):
+                return function(*arguments, **keyword_arguments)
+        return wrapper
+    return decorator
+
+def collected_lines():
+    # Return lines of the counters kept by other modules: the scraper's download counters and the cache of downloaded pages.
+    # The modules are read only if they were already imported (importing them just to read zeros would slow down the first request).
+    lines = []
+    scraper = sys.modules.get("app.scraper")
+    if scraper is None:
+        return lines
+    with scraper._stats_lock:
+        stats = dict(scraper.stats)
+    names = {"requests": "ceneo_downloaded_pages_total", "bytes": "ceneo_downloaded_bytes_total", "seconds": "ceneo_download_seconds_total",
+             "retries": "ceneo_retries_total", "throttled": "ceneo_throttled_total", "throttled_seconds": "ceneo_throttled_seconds_total",
+             "failures": "ceneo_failed_requests_total", "timeouts": "ceneo_timeouts_total",
+             "circuit_opened": "ceneo_circuit_opened_total", "circuit_rejected": "ceneo_circuit_rejected_total"}
+    for key, name in names.items():
+        lines += [f"# TYPE {name} counter", f"{name} {stats[key]}"]
+    if scraper.response_cache is not None:
+        cache_stats = dict(scraper.response_cache.stats)
+        lines.append("# TYPE ceneo_cache_total counter")
+        lines += [f'ceneo_cache_total{{result="{result}"}} {amount}' for result, amount in cache_stats.items()]
+        # The fraction of pages which didn't have to be downloaded again (fresh pages and pages which didn't change).
+        used = cache_stats["hits"] + cache_stats["revalidations"]
+        total = used + cache_stats["misses"]
+        lines += ["# TYPE ceneo_cache_hit_ratio gauge", f"ceneo_cache_hit_ratio {used / total if total else 0}"]
+    return lines
+
+def render():
+    # Return every metric in the Prometheus text format.
+    lines = []
+    with _lock:
+        metrics = list(_metrics.values())
+    for metric in metrics:
+        lines += [f"# HELP {metric.name} {metric.description}", f"# TYPE {metric.name} {metric.kind}"] + metric.lines()
+    return "\n".join(lines + collected_lines()) + "\n"
+
+def init_app(app):
+    # Measure the time of every request to the app and turn on profiling of single requests (if it's configured).
+    from flask import g, request, Response
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        token = metrics_parameters["profile_token"]
+        if token and request.headers.get("X-Profile") == token:
+            # "cProfile" package measures the time spent in every function. It's imported only when it's used.
+            import cProfile
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def stop_timer(response):
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            response = profile_summary(profiler)
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            # The route's pattern (e.g. "/product/<product_id>") is used instead of the URL, so every product is counted together.
+            route = request.url_rule.rule if request.url_rule else "unknown"
+            route_seconds.observe(time.perf_counter() - start, route, request.method, response.status_code)
+        return response
+
+    def profile_summary(profiler):
+        # Return a response with the functions which took the most time (including the functions they called).
+        import pstats
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(metrics_parameters["profile_lines"])
+        return Response(summary.getvalue(), mimetype="text/plain")
@@ -1,21 +1,52 @@
+# "sys" package is used here for interning strings (see the intern() function below).
+import sys
 from app.parameters import selectors
-from app.utils import get_item
+
+# The compiled selectors. They're compiled only once, when the first opinion is extracted, instead of once for every opinion.
+compiled_selectors = None
+
+def get_compiled_selectors():
+    # Return the compiled selectors, compiling them the first time they're needed.
+    # app.utils uses Beautiful Soup, which takes a long time to import, so it's imported only when opinions are extracted.
+    global compiled_selectors
+    if compiled_selectors is None:
+        from app.utils import compile_selectors
+        compiled_selectors = compile_selectors(selectors)
+    return compiled_selectors
+
+# Attributes with only a few different values (e.g. "Polecam", "4,5/5", "12") or values repeated by many opinions (e.g. dates).
+# Their values are interned, so every opinion with the same value shares a single string instead of storing its own copy.
+# Pros and cons are chosen from a list of features prepared by the website, so they repeat too.
+interned_attributes = ("author", "recommendation", "stars", "useful", "useless", "published", "purchased", "pros", "cons")
+
+def intern(value):
+    # Return the interned version of a string, or a list of interned versions of strings in a list (other values are returned unchanged).
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return [intern(item) for item in value]
+    return value
 
 # Class represention of a single opinion.
 class Opinion():
+    # "__slots__" lists every attribute an Opinion object can have. Thanks to that, the attributes are stored in a fixed-size
+    # structure instead of a separate dictionary for every object, so a product with thousands of opinions takes much less memory.
+    __slots__ = ("author", "recommendation", "stars", "content", "useful", "useless", "published", "purchased", "pros", "cons", "opinion_id")
+
     # Default values: author="" means that if no author parameters are passed, the default value for the author attribute is "".
+    # The default value of pros and cons is None, not [], because a default [] would be a single list shared by every Opinion object.
     def __init__(self, author="", recommendation=None, stars=0, content="", useful=0, useless=0, published=None,
-                 purchased=None, pros=[], cons=[], opinion_id=""):
-        self.author = author
-        self.recommendation = recommendation
-        self.stars = stars
+                 purchased=None, pros=None, cons=None, opinion_id=""):
+        self.author = intern(author)
+        self.recommendation = intern(recommendation)
+        self.stars = intern(stars)
         self.content = content
-        self.useful = useful
-        self.useless = useless
-        self.published = published
-        self.purchased = purchased
-        self.pros = pros
-        self.cons = cons
+        self.useful = intern(useful)
+        self.useless = intern(useless)
+        self.published = intern(published)
+        self.purchased = intern(purchased)
+        self.pros = intern(pros) if pros is not None else []
+        self.cons = intern(cons) if cons is not None else []
         self.opinion_id = opinion_id
 
     def __str__(self):
@@ -34,16 +65,14 @@ class Opinion():
 
     # The "opinion" parameter isn't an Opinion object, but an HTML tag.
     def extract_opinion(self, opinion):
-        # "selectors.items()" creates a (key, value) tuple from a pair of key-value from the selectors dictionary.
+        # extract_items() returns a dictionary with the same keys as the selectors dictionary and values found in the HTML tag.
+        # "items.items()" creates a (key, value) tuple from a pair of key-value from the dictionary.
         # "for key, value [...]" unpacks the tuple into two separate variables "key" and "value".
-        # "key" is a string, "value" is a list.
-        for key, value in selectors.items():
-            # setattr() function sets the value of the current object's attribute
-            # named the same as the "key" value to the value returned by the get_item() function.
-            # "*value" means that every element in the "value" variable (which is a list)
-            # is passed as a separate parameter instead of passing the whole list as a single parameter.
-            # "*" (and "**") before a variable name specifies that the iterable will be unpacked.
-            setattr(self, key, get_item(opinion, *value))
+        from app.utils import extract_items
+        for key, value in extract_items(opinion, get_compiled_selectors()).items():
+            # setattr() function sets the value of the current object's attribute named the same as the "key" value to the "value" value
+            # (interned, if the attribute has only a few different values).
+            setattr(self, key, intern(value) if key in interned_attributes else value)
         # Set the current object's "opinion_id" attribute to the value of the "data-entry-id" HTML div tag's class attribute.
         self.opinion_id = opinion["data-entry-id"]
         # Return the current object, now with the newly set attributes.
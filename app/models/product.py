@@ -1,32 +1,57 @@
-# "Requests" package is used for sending HTTP requests.
-import requests
 # "json" package is used for working with .json files.
 import json
 # "os" package is used for reading/writing to files.
 import os
-# "Beautiful Soup" package is used for parsing HTML documents.
-from bs4 import BeautifulSoup
-# "pandas" package is used for generating and manipulating data and data structures.
-import pandas as pd
-# "NumPy" package is used for scientific computing.
-import numpy as np
-# "Matplotlib" package is used for generating charts and graphs.
-from matplotlib import pyplot as plt
 # Import the Opinion class from the app/models directory.
 from app.models.opinion import Opinion
-from app.utils import get_item
+from app.parameters import ceneo_url, html_parser, scraping, selectors, storage
+from app import catalogue, charts
+# "timed" measures the time of every call of a method (see app/metrics.py).
+from app.metrics import timed, parse_seconds, scrape_pages, scrape_opinions
+from app.opinion_index import update_index
+from app.utils import atomic_path
+# Packages which take a long time to import are imported only by the methods using them, so starting the app
+# (and opening pages which don't use them, e.g. /products) is fast:
+#   - "Beautiful Soup" package is used for parsing HTML documents,
+#   - "pandas" package is used for generating and manipulating data and data structures,
+#   - "NumPy" package is used for scientific computing,
+#   - app.scraper (which uses the "requests" package) is used for downloading pages,
+#   - app.storage (which uses NumPy) is used for reading/writing the binary files of opinions.
 
 class Product():
     # Default values: product_name="" means that if no product_name parameters are passed, the default value for the product_name attribute is "".
     # The "product_id" variable must be passed while creating a Product object, otherwise the object will not be created.
-    def __init__(self, product_id, opinions=[], product_name="", opinions_count=0, pros_count=0, cons_count=0, average_score=0):
+    # The default value of opinions is None, not [], because a default [] would be a single list shared by every Product object
+    # (so opinions of one product would show up in every other product).
+    def __init__(self, product_id, opinions=None, product_name="", opinions_count=0, pros_count=0, cons_count=0, average_score=0):
         self.product_id = product_id
-        self.opinions = opinions
+        # The pandas DataFrame of opinions returned by opinions_to_df(). It's set to None whenever the "opinions" attribute
+        # is replaced or changed by a method, so the DataFrame is created again only if the opinions change.
+        self._opinions_df = None
+        self.opinions = opinions if opinions is not None else []
         self.product_name = product_name
         self.opinions_count = opinions_count
         self.pros_count = pros_count
         self.cons_count = cons_count
         self.average_score = average_score
+        # The amount of pages of opinions downloaded so far and the amount of opinions extracted from them. Used for reporting progress
+        # of the extraction. The opinions extracted don't include the stored opinions added by extract_new_opinions().
+        self.pages_fetched = 0
+        self.opinions_extracted = 0
+        # The amount of each recommendation and of each score given, calculated by the calculate_stats() method.
+        self.recommendations = None
+        self.stars_distribution = None
+
+    # "@property" makes "product.opinions" call this method, and "@opinions.setter" makes "product.opinions = [...]" call the method below,
+    # so replacing the list of opinions (anywhere, not only in this class) removes the DataFrame created from the old list.
+    @property
+    def opinions(self):
+        return self._opinions
+
+    @opinions.setter
+    def opinions(self, opinions):
+        self._opinions = opinions
+        self._opinions_df = None
     
     def __str__(self) -> str:
         # Return a human-readable string representation of a Product object.
@@ -58,54 +83,125 @@ class Product():
             "opinions": [opinion.to_dict() for opinion in self.opinions]
         }
         
+    @timed("name")
     def extract_name(self):
-        product_url = f"https://www.ceneo.pl/{self.product_id}#tab=reviews"
-        # Send a GET request to the "product_url" website.
-        response = requests.get(product_url)
-        # Enable parsing the HTML document (using "html.parser" - Python's built-in HTML parser module)
+        from bs4 import BeautifulSoup
+        from requests import HTTPError
+        from app.scraper import fetch
+        from app.utils import get_item
+        product_url = f"{ceneo_url}/{self.product_id}#tab=reviews"
+        try:
+            # Send a GET request to the "product_url" website.
+            response = fetch(product_url)
+        except HTTPError as error:
+            # "404 Not Found" means that the product doesn't exist, so the product has no name.
+            if error.response is not None and error.response.status_code == 404:
+                return self
+            raise
+        # Enable parsing the HTML document (using "lxml" if it's installed, otherwise "html.parser" - Python's built-in HTML parser module)
         # found in a response from the GET request.
-        page = BeautifulSoup(response.text, "html.parser")
+        page = BeautifulSoup(response, html_parser)
         # Set the current Product object's name as the text found in the "h1.product-top__product-info__name" HTML element.
         self.product_name = get_item(page, "h1.product-top__product-info__name")
         return self
 
-    def extract_opinions(self):
-        product_url = f"https://www.ceneo.pl/{self.product_id}#tab=reviews"
-
-        while product_url:
-            # Send a GET request to the "product_url" website.
-            response = requests.get(product_url)
-            # Enable parsing the HTML document (using "html.parser" - Python's built-in HTML parser module)
-            # found in a response from the GET request.
-            page = BeautifulSoup(response.text, "html.parser")
-            # From the "page" BeautifulSoup object create a list of sections of an HTML document containing the passed CSS selector.
-            # "div.js_product-review" refers to every "div" HTML tag with a class attribute equal to "js_product-review".
-            # "opinions" is not the same as "self.opinions". "opinions" is a local variable accessible only in this method,
-            # "self.opinions" is the Product class's attribute, accesible anywhere.
-            opinions = page.select("div.js_product-review")
-
-            # For every opinion (section) in the "opinions" list
-            for opinion in opinions:
-                # add a new Opinion object to the current Product object's "opinions" attribute.
-                self.opinions.append(Opinion().extract_opinion(opinion))
-
-            # After extracting every opinion from the current page of opinions,
-            # check if the current page is the last one available.
-            try:
-                product_url = "https://www.ceneo.pl" + get_item(page, "a.pagination__next", "href")
-            # If there are no pages after the current page, stop extracting opinions.
-            except TypeError:
-                product_url = None
+    # "concurrent=True" means that the next pages of opinions are downloaded in the background
+    # while the current page is being parsed. "concurrent=False" downloads pages one after another.
+    # "parse" is the function used for parsing a single page, see parse_page() below.
+    # "known_ids" is a set of IDs of opinions extracted before. If it's passed, known opinions are skipped
+    # and the extraction stops at the first page containing only known opinions.
+    @timed("opinions")
+    def extract_opinions(self, concurrent=True, parse=None, known_ids=None):
+        pages_fetched, opinions_count = self.pages_fetched, len(self.opinions)
+        for opinion in self.iter_opinions(concurrent, parse, known_ids):
+            # Add the extracted Opinion object to the current Product object's "opinions" attribute.
+            self.opinions.append(opinion)
+            self.opinions_extracted += 1
+            self._opinions_df = None
+        # Remember how many pages and opinions this extraction found.
+        scrape_pages.observe(self.pages_fetched - pages_fetched)
+        scrape_opinions.observe(len(self.opinions) - opinions_count)
         return self
 
+    # Return a generator of Opinion objects about the product, created as soon as each page of opinions is parsed,
+    # so they can be used (e.g. saved) before every page is downloaded. The opinions are NOT added to the "opinions" attribute.
+    # The parameters are the same as the parameters of the extract_opinions() method.
+    def iter_opinions(self, concurrent=True, parse=None, known_ids=None):
+        from app.scraper import fetch, PagePrefetcher, last_page_number
+        # "parse_page" can't be used as the default value, because it's defined after the Product class.
+        parse = parse or parse_page
+        product_url = f"{ceneo_url}/{self.product_id}#tab=reviews"
+        # If pages should be downloaded one after another, "get_page" simply downloads the requested page.
+        # Otherwise the "PagePrefetcher" object downloads the requested page and the pages predicted to come after it.
+        # If known opinions are skipped, the extraction usually stops after a page or two, so only one page is downloaded ahead
+        # (the pages after the last needed page would be downloaded for nothing).
+        prefetcher = (PagePrefetcher(workers=1) if known_ids is not None else PagePrefetcher()) if concurrent else None
+        get_page = prefetcher.get if concurrent else fetch
+
+        first_page = True
+        # "try ... finally" makes sure that the prefetcher stops downloading pages after the last page is parsed (or an error occurs).
+        try:
+            while product_url:
+                # Send a GET request to the "product_url" website (or wait for the already sent request to finish).
+                response = get_page(product_url)
+                # The first page shows the amount of opinions, so only the pages which exist are downloaded ahead.
+                if prefetcher and first_page:
+                    prefetcher.last_page = last_page_number(response)
+                first_page = False
+                self.pages_fetched += 1
+                # Extract the opinions and the link to the next page from the downloaded HTML document.
+                with parse_seconds.time():
+                    opinions, next_page = parse(response)
+                # The downloaded page is no longer needed, so it doesn't have to take up memory while the opinions are being used.
+                del response
+                if known_ids is not None:
+                    new_opinions = [opinion for opinion in opinions if opinion.opinion_id not in known_ids]
+                    # Newer opinions come first, so if every opinion on the current page is known,
+                    # every opinion on the next pages is known too.
+                    if opinions and not new_opinions:
+                        next_page = None
+                    opinions = new_opinions
+                # If there are no pages after the current page, stop downloading the predicted pages right away,
+                # instead of after the opinions are used.
+                if not next_page and prefetcher:
+                    prefetcher.close()
+                # "yield from" returns the opinions one by one from the generator.
+                yield from opinions
+                # If there are no pages after the current page, stop extracting opinions.
+                product_url = ceneo_url + next_page if next_page else None
+        finally:
+            if prefetcher:
+                prefetcher.close()
+
+    # Extract only the opinions posted since the product was last extracted and add them to the stored ones.
+    def extract_new_opinions(self, concurrent=True, parse=None):
+        # If the product was never extracted before, extract every opinion.
+        if not os.path.exists(f"app/products/{self.product_id}.json"):
+            return self.extract_opinions(concurrent, parse).calculate_stats()
+
+        # Import the stored product's statistics and opinions.
+        stored = Product(self.product_id)
+        stored.import_product()
+        # Extract only the opinions with IDs not found in the stored opinions.
+        self.extract_opinions(concurrent, parse, known_ids={opinion.opinion_id for opinion in stored.opinions})
+        # New opinions come first, just like on the scraped website.
+        self.opinions = self.opinions + stored.opinions
+        # Calculate the statistics from every opinion, so they're the same as if the product was extracted from scratch.
+        return self.calculate_stats()
+
     def opinions_to_df(self):
-        # Convert a list of dictionaries of opinion's attributes to a JSON formatted string and then convert that string to a pandas object.
-        opinions = pd.read_json(json.dumps(self.opinions_to_dict()))
+        # Return the DataFrame created before, if the opinions didn't change since then.
+        if self._opinions_df is not None:
+            return self._opinions_df
+        import pandas as pd
+        # Create a pandas object straight from the opinions' attributes: one column (list of values) for every attribute.
+        columns = ["opinion_id"] + list(selectors.keys())
+        opinions = pd.DataFrame({column: [getattr(opinion, column) for opinion in self.opinions] for column in columns}, columns=columns)
         # Replace every value (e.g "3,5/5", "0/5", "4/5") of "stars" attribute with a converted float value (e.g "3.5", "0.0", "4.0").
-        # map() function applies a function to every element of an iterable.
-        # "x.split("/")[0].replace(",",".")" splits "x" (here it may be e.g. "3,5/5") into two values using "/" character as a separator,
-        # only keeps the first value (e.g. "3,5") and replaced "," characters with "." characters.
-        opinions["stars"] = opinions["stars"].map(lambda x: float(x.split("/")[0].replace(",",".")))
+        # The ".str" methods work on every value of a column at once: split every value into two values using "/" character as a separator,
+        # only keep the first value (e.g. "3,5") and replace "," characters with "." characters.
+        opinions["stars"] = opinions["stars"].astype(object).str.split("/").str[0].str.replace(",", ".", regex=False).astype(float)
+        self._opinions_df = opinions
         return opinions
 
     def stats_to_dict(self):
@@ -123,60 +219,42 @@ class Product():
         # Return a list of dictionaries of opinions' attributes.
         return [opinion.to_dict() for opinion in self.opinions]
 
+    @timed("stats")
     def calculate_stats(self):
+        # Create the DataFrame of opinions only once and calculate every statistic from it.
+        opinions = self.opinions_to_df()
         # Count the total amount of opinions.
-        self.opinions_count = self.opinions_to_df().shape[0]
-        # Count the amount of opinions with pros about the product.
-        self.pros_count = int(self.opinions_to_df()["pros"].map(bool).sum())
-        # Count the amount of opinions with cons about the product.
-        self.cons_count = int(self.opinions_to_df()["cons"].map(bool).sum())
-        # Calculate the mean of stars given.
-        self.average_score = self.opinions_to_df()["stars"].mean().round(2)
+        self.opinions_count = opinions.shape[0]
+        # Count the amount of opinions with pros (and cons) about the product: the opinions with a non-empty list of pros (cons).
+        # ".map(bool)" converts every list in a column to True if it isn't empty (unlike ".str" methods, it also works if there are no opinions).
+        self.pros_count = int(opinions["pros"].map(bool).sum())
+        self.cons_count = int(opinions["cons"].map(bool).sum())
+        # Calculate the mean of stars given (0, the same as the default value, if there are no opinions).
+        self.average_score = round(float(opinions["stars"].mean()), 2) if self.opinions_count else 0
+        self.calculate_distributions()
         return self
 
-    def draw_charts(self):
+    def calculate_distributions(self):
+        import numpy as np
         opinions = self.opinions_to_df()
-
-        # If the "app/static/plots" directory does NOT exist,
-        if not os.path.exists("app/static/plots"):
-            # create it.
-            os.makedirs("app/static/plots")
-
-        # Count the amount of each score given, sort them in an ascending order
-        # and replace the old index with a new index ("Nie polecam", "Polecam", None).
-        # "dropna=False" specifies counting the values even if they are missing (NaN).
+        # Count the amount of each recommendation given ("Nie polecam", "Polecam", None).
+        # "dropna=False" specifies counting the values even if they are missing (None).
         # "fill_value=0" specifies filling missing (NaN) values with 0s.
-        recommendation = opinions["recommendation"].value_counts(dropna=False).sort_index().reindex(["Nie polecam", "Polecam", None], fill_value=0)
-        # Generate a pie plot.
-        recommendation.plot.pie(
-            label="",
-            # Generate and add percent values as labels of each wedge on the pie plot.
-            autopct = lambda p: '{:.1f}%'.format(round(p)) if p > 0 else '',
-            colors = ["crimson", "forestgreen", "lightskyblue"],
-            labels = ["Nie polecam", "Polecam", "Nie mam zdania"]
-        )
-
-        plt.title("Rekomendacje")
-        plt.savefig(f"app/static/plots/{self.product_id}_recommendations.png")
-        plt.close()
-
-        # Count the amount of each score given, sort them in an ascending order
-        # and replace the old index (e.g. "0/5", "2/5", "4,5/5") with a new index (e.g. "0.0", "2.0", "4.5").
-        # "fill_value=0" specifies filling missing (NaN) values with 0s.
-        stars = opinions["stars"].value_counts().sort_index().reindex(list(np.arange(0,5.5,0.5)), fill_value=0)
-        # Generate a bar plot.
-        stars.plot.bar(
-            color = "coral"
-        )
-        plt.title("Oceny produktu")
-        plt.xlabel("Liczba gwiazdek")
-        plt.ylabel("Liczba opinii")
-        plt.grid(True, axis="y")
-        plt.xticks(rotation=0)
-        plt.savefig(f"app/static/plots/{self.product_id}_stars.png")
-        plt.close()
+        self.recommendations = opinions["recommendation"].value_counts(dropna=False).reindex(["Nie polecam", "Polecam", None], fill_value=0)
+        # Count the amount of each score given, sorted in an ascending order (0.0, 0.5, ..., 5.0).
+        self.stars_distribution = opinions["stars"].value_counts().reindex(list(np.arange(0, 5.5, 0.5)), fill_value=0)
         return self
 
+    def draw_charts(self):
+        # Count the recommendations and scores again (e.g. if calculate_stats() wasn't called).
+        # The DataFrame of opinions is reused if the opinions didn't change, so this is fast.
+        self.calculate_distributions()
+        # Draw the charts in the background (see app/charts.py). Returns a Future object, "draw_charts().result()" waits
+        # until the charts are drawn and returns the names of their files.
+        # The charts remember the modification time of the saved opinions, so they should be drawn after export_opinions().
+        return charts.submit(self.product_id, [int(amount) for amount in self.recommendations], [int(amount) for amount in self.stars_distribution])
+
+    @timed("export_product")
     def export_product(self):
         # If the "app/products" directory does NOT exist,
         if not os.path.exists("app/products"):
@@ -188,19 +266,37 @@ class Product():
             # Save the product's statistics to the .json file.
             # "ensure_ascii=False" enables saving non-ASCII characters (e. g. letters with accents) to the file.
             json.dump(self.stats_to_dict(), jf, indent=4, ensure_ascii=False)
+        # Add the product's statistics to the catalogue of products (used by the /products page).
+        catalogue.save_product(self.stats_to_dict())
 
+    @timed("export_opinions")
     def export_opinions(self):
         # If the "app/opinions" directory does NOT exist,
         if not os.path.exists("app/opinions"):
             # create it.
             os.makedirs("app/opinions")
 
-        # Open a .json file with writing enabled.
-        with open(f"app/opinions/{self.product_id}.json", "w", encoding="UTF-8") as jf:
-            # Save the product's opinons to the .json file.
-            # "ensure_ascii=False" enables saving non-ASCII characters (e. g. letters with accents) to the file.
-            json.dump(self.opinions_to_dict(), jf, indent=4, ensure_ascii=False)
+        # Open a temporary .json file with writing enabled. The file replaces the old .json file only after it's written,
+        # so a page of opinions read at the same time (see app/opinion_index.py) never reads a half-written file.
+        path = f"app/opinions/{self.product_id}.json"
+        with atomic_path(path) as temporary_path:
+            with open(temporary_path, "w", encoding="UTF-8") as jf:
+                # Save the product's opinons to the .json file.
+                # "ensure_ascii=False" enables saving non-ASCII characters (e. g. letters with accents) to the file.
+                json.dump(self.opinions_to_dict(), jf, indent=4, ensure_ascii=False)
+        # Save the opinions in the binary format too (after the .json file, so the .bin file is never older than it).
+        if storage["binary"]:
+            from app.storage import binary_path, write_opinions
+            try:
+                write_opinions(binary_path(self.product_id), self.opinions_to_dict(), ["opinion_id"] + list(selectors.keys()))
+            # On Windows, the old .bin file can't be replaced while it's still being read. It's older than the new .json file,
+            # so it isn't used (see read_store() in app/storage.py) and the opinions are read from the .json file instead.
+            except PermissionError:
+                pass
+        # Index the saved opinions, so the first page of them can be displayed right away.
+        update_index(self.product_id)
     
+    @timed("import")
     def import_product(self, import_opinions=True):
         # If a .json file with the passed product_id exists,
         if os.path.exists(f"app/products/{self.product_id}.json"):
@@ -218,7 +314,23 @@ class Product():
 
             # If the optional parameter "import_opinions" is set to True, import opinions.
             if import_opinions:
-                # Open a .json file with only writing enabled.
+                # The imported opinions are added to the "opinions" attribute, so the DataFrame of opinions has to be created again.
+                self._opinions_df = None
+                # Read the opinions from the .bin file, if it exists (it's much faster than reading the .json file).
+                # app.storage uses NumPy, which takes a long time to import, so it's imported only if .bin files are used.
+                store = None
+                if storage["binary"]:
+                    from app.storage import read_store
+                    store = read_store(self.product_id)
+                if store is not None:
+                    with store:
+                        # The values are read in the same order as the parameters of Opinion(), so they're passed to it
+                        # as they are, without creating a dictionary for every opinion first.
+                        # "*values" passes every value in the tuple as a separate parameter.
+                        self.opinions.extend(Opinion(*values) for values in store.rows(list(selectors.keys()) + ["opinion_id"]))
+                    return
+
+                # Open a .json file with only reading enabled.
                 with open(f"app/opinions/{self.product_id}.json", "r", encoding="UTF-8") as jf:
                     # Convert a JSON object to a Python object.
                     opinions = json.load(jf)
@@ -230,3 +342,21 @@ class Product():
                     # is passed as separate parameter instead of passing the whole dictionary as a single parameter.
                     # "**" (and "*") before a variable name specifies that the iterable will be unpacked.
                     self.opinions.append(Opinion(**opinion))
+
+# The "html" parameter is an HTML document of a single page of opinions.
+# This is a function, not a method, so it can be sent to (and run in) another process.
+def parse_page(html):
+    # If streaming is turned on, read the page piece by piece instead of building a tree of the whole page.
+    if scraping["streaming"]:
+        from app.streaming import parse_page_streaming
+        return parse_page_streaming(html)
+    from bs4 import BeautifulSoup
+    from app.utils import get_item
+    # Enable parsing the HTML document (using "lxml" if it's installed, otherwise "html.parser" - Python's built-in HTML parser module).
+    page = BeautifulSoup(html, html_parser)
+    # From the "page" BeautifulSoup object create a list of sections of an HTML document containing the passed CSS selector.
+    # "div.js_product-review" refers to every "div" HTML tag with a class attribute equal to "js_product-review".
+    # For every opinion (section) in the list create a new Opinion object.
+    opinions = [Opinion().extract_opinion(opinion) for opinion in page.select("div.js_product-review")]
+    # Return the opinions and the link to the next page of opinions (None if the current page is the last one available).
+    return opinions, get_item(page, "a.pagination__next", "href")
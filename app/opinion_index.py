@@ -0,0 +1,109 @@
+# opinion_index.py is a module storing functions used for reading a single page of a product's opinions.
+# Every opinion in the app/opinions/<product_id>.json file is indexed in the catalogue (app/catalogue.py): the values opinions
+# can be sorted and filtered by, and the place of the opinion in the file. A page of opinions is found in the catalogue
+# and only the opinions on it are read from the file, so the whole file never has to be read (or kept in memory).
+# "json" package is used for working with .json files.
+import json
+# "os" package is used for reading/writing to files.
+import os
+# "threading" package is used for making sure the same file isn't indexed by two threads at once.
+import threading
+from app import catalogue
+from app.exports import opinions_path, to_number
+
+# Locks of files being indexed, one for every product.
+_locks = {}
+_locks_lock = threading.Lock()
+
+# The largest amount of opinions returned at once.
+MAX_LIMIT = 100
+# The amount of times reading a page of opinions is tried when the .json file is replaced while it's being read.
+READ_ATTEMPTS = 3
+
+def to_stars(value):
+    # Return the amount of stars (e.g. "4,5/5") as a number (e.g. 4.5), or None if there are no stars.
+    if not value:
+        return None
+    return float(str(value).split("/")[0].replace(",", "."))
+
+def scan_opinions(path):
+    # Return a generator of dictionaries of opinions' attributes found in a .json file, together with the number of the first byte
+    # of every opinion in the file and the amount of its bytes.
+    with open(path, "rb") as jf:
+        data = jf.read()
+    text = data.decode("UTF-8")
+    decoder = json.JSONDecoder()
+    # "position" is the number of the current character, "byte" is the number of its first byte
+    # (letters with accents take more than one byte, so the numbers differ).
+    position = text.index("[") + 1
+    byte = len(text[:position].encode("UTF-8"))
+    while True:
+        # Skip white space and commas between opinions.
+        start = position
+        while text[position] in " \t\r\n,":
+            position += 1
+        if text[position] == "]":
+            return
+        byte += position - start
+        # raw_decode() reads a single JSON object starting at the passed character and returns the number of the character after it.
+        opinion, end = decoder.raw_decode(text, position)
+        length = len(text[position:end].encode("UTF-8"))
+        yield opinion, byte, length
+        byte += length
+        position = end
+
+def index_row(product_id, position, opinion, start, length):
+    # Return a row of the "opinions" table of the catalogue.
+    return {
+        "product_id": product_id,
+        "position": position,
+        "opinion_id": opinion.get("opinion_id"),
+        "recommendation": opinion.get("recommendation"),
+        "stars": to_stars(opinion.get("stars")),
+        "useful": to_number(opinion.get("useful")),
+        "useless": to_number(opinion.get("useless")),
+        "published": opinion.get("published"),
+        "pros_count": len(opinion.get("pros") or []),
+        "cons_count": len(opinion.get("cons") or []),
+        "start": start,
+        "length": length,
+    }
+
+def update_index(product_id, force=False):
+    # Index the product's opinions, unless the .json file didn't change since it was indexed last time ("force=True" indexes them anyway).
+    path = opinions_path(product_id)
+    with _locks_lock:
+        lock = _locks.setdefault(product_id, threading.Lock())
+    with lock:
+        modified = os.stat(path).st_mtime_ns
+        if not force and catalogue.indexed_modified(product_id) == modified:
+            return
+        rows = [index_row(product_id, position, opinion, start, length)
+                for position, (opinion, start, length) in enumerate(scan_opinions(path))]
+        catalogue.index_opinions(product_id, modified, rows)
+
+def read_page(product_id, sort="position", descending=False, filter=None, offset=0, limit=20):
+    # Return a list of dictionaries of the opinions on the requested page and the amount of every opinion matching the filter.
+    # Raises FileNotFoundError if the product doesn't exist and KeyError if the filter doesn't exist.
+    # The .json file may be replaced by a new extraction at any time (see Product.export_opinions()), so the opinions are read
+    # only if the index was made for the opened version of the file. Otherwise the file is indexed and read again.
+    for attempt in range(READ_ATTEMPTS):
+        # The opened file doesn't change, even if a new file replaces it in the meantime.
+        with open(opinions_path(product_id), "rb") as jf:
+            modified = os.fstat(jf.fileno()).st_mtime_ns
+            update_index(product_id)
+            places, total, indexed = catalogue.find_opinions(product_id, sort, descending, filter, offset, min(limit, MAX_LIMIT))
+            if indexed != modified:
+                continue
+            try:
+                opinions = []
+                for start, length in places:
+                    # Go to the opinion's first byte and read only the opinion.
+                    jf.seek(start)
+                    opinions.append(json.loads(jf.read(length).decode("UTF-8")))
+                return opinions, total
+            # The index doesn't match the file, even though the modification times are the same
+            # (e.g. the file was replaced twice within the precision of the file system's clock).
+            except (ValueError, UnicodeDecodeError):
+                update_index(product_id, force=True)
+    raise RuntimeError(f"The opinions of product {product_id} changed while they were being read.")
@@ -1,3 +1,8 @@
+# "os" package is used here for reading environment variables.
+import os
+# "find_spec" checks if a package is installed without importing it.
+from importlib.util import find_spec
+
 # A dictionary of HTML class attributes. Keys refer to the HTML class attributes extracted from a single opinion on the website.
 selectors = {
     # Select all <span> tags with a "class" attribute equal to "user-post__author-name".
@@ -17,3 +22,110 @@ selectors = {
     "pros": ["div[class$=positives] ~ div.review-feature__item", None, True],
     "cons": ["div[class$=negatives] ~ div.review-feature__item", None, True]
 }
+
+# The address of the scraped website.
+# It can be changed with the "CENEO_URL" environment variable, e.g. to point the scraper to a local server serving saved pages.
+ceneo_url = os.environ.get("CENEO_URL", "https://www.ceneo.pl").rstrip("/")
+
+# A dictionary of settings used while downloading pages from the scraped website.
+scraping = {
+    # The maximum number of pages downloaded at the same time from a single host (website).
+    # Setting it to 1 makes the scraper download pages one after another.
+    "max_connections_per_host": int(os.environ.get("CENEO_CONNECTIONS", 4)),
+    # The amount of opinions shown on a single page. Used for calculating the amount of pages from the amount of opinions,
+    # so pages after the last one aren't downloaded ahead.
+    "opinions_per_page": 10,
+    # If True, pages are parsed piece by piece and only the opinions are turned into Beautiful Soup objects, which takes much less memory.
+    # Setting the "CENEO_STREAMING" environment variable to "0" parses whole pages instead.
+    "streaming": os.environ.get("CENEO_STREAMING", "1") != "0",
+    # The amount of requests sent to a single host per second at the start ("CENEO_RATE=0" turns the limit off).
+    # The rate grows by "rate_increase" after every successful response (up to "max_rate") and is halved (down to "min_rate")
+    # every time the website answers "429 Too Many Requests".
+    "rate": float(os.environ.get("CENEO_RATE", 4)),
+    "max_rate": float(os.environ.get("CENEO_MAX_RATE", 20)),
+    "min_rate": 0.2,
+    "rate_increase": 0.25,
+    # The amount of requests which can be sent at once after a break (the size of the "token bucket").
+    "burst": int(os.environ.get("CENEO_BURST", 4)),
+    # The amount of times a request is sent again after a "429", "5xx" response, a timeout or a broken connection.
+    "retries": int(os.environ.get("CENEO_RETRIES", 4)),
+    # Waiting time (in seconds) before the first retry. It's doubled before every next retry, but never longer than "max_backoff".
+    "backoff": 0.5,
+    "max_backoff": 30.0,
+    # The longest waiting time (in seconds) asked for by the website's "Retry-After" header which is respected.
+    # If the website asks to wait longer, the request fails right away instead of blocking the extraction (and the host).
+    "max_retry_after": float(os.environ.get("CENEO_MAX_RETRY_AFTER", 30)),
+    # Maximum waiting time (in seconds) for a connection to the website and for the website's response.
+    "connect_timeout": float(os.environ.get("CENEO_CONNECT_TIMEOUT", 5)),
+    "read_timeout": float(os.environ.get("CENEO_READ_TIMEOUT", 30)),
+    # After "circuit_failures" failed requests in a row (server errors, timeouts, broken connections) no requests are sent
+    # to the host for "circuit_reset" seconds, then a single request is sent to check if the website works again.
+    "circuit_failures": int(os.environ.get("CENEO_CIRCUIT_FAILURES", 10)),
+    "circuit_reset": float(os.environ.get("CENEO_CIRCUIT_RESET", 60)),
+}
+
+# A dictionary of settings of the background extraction jobs.
+jobs = {
+    # The amount of products extracted at the same time.
+    "workers": int(os.environ.get("CENEO_JOB_WORKERS", 2)),
+    # The amount of jobs remembered in the catalogue (so their status can still be checked).
+    "history": 1000,
+    # How often (in seconds) the progress of running jobs is saved in the catalogue, where every process of the app can read it.
+    "progress_interval": 1,
+    # A job whose progress wasn't saved for this many seconds is treated as failed (its process was stopped).
+    "stale_after": 60,
+}
+
+# A dictionary of settings of the cache of downloaded pages.
+cache = {
+    # Setting the "CENEO_CACHE" environment variable to "0" turns the cache off.
+    "enabled": os.environ.get("CENEO_CACHE", "1") != "0",
+    "directory": os.environ.get("CENEO_CACHE_DIR", "app/cache"),
+    # For how long (in seconds) a downloaded page is reused without asking the website if it has changed.
+    # After that time the website is asked, but the page is downloaded again only if it has changed.
+    "ttl": int(os.environ.get("CENEO_CACHE_TTL", 600)),
+    # The maximum size of the cache (in bytes). When it's exceeded, the least recently used pages are removed.
+    "max_size": int(os.environ.get("CENEO_CACHE_SIZE", 256 * 1024 * 1024)),
+}
+
+# The parser used by Beautiful Soup. "lxml" is much faster than Python's built-in "html.parser", but has to be installed separately,
+# so it's used only if it's installed. The parser can also be chosen with the "CENEO_PARSER" environment variable.
+html_parser = os.environ.get("CENEO_PARSER") or ("lxml" if find_spec("lxml") else "html.parser")
+
+# A dictionary of settings of the catalogue of products (an SQLite database with statistics of every extracted product).
+catalogue = {
+    "path": "app/catalogue.db",
+    # The amount of products displayed on a single page of the /products page.
+    "per_page": 50,
+}
+
+# A dictionary of settings of saved opinions.
+storage = {
+    # Save opinions in the binary format (app/opinions/<product_id>.bin, see app/storage.py) next to the .json files,
+    # and read them from the .bin files. Setting the "CENEO_BINARY_STORAGE" environment variable to "0" turns it off.
+    "binary": os.environ.get("CENEO_BINARY_STORAGE", "1") != "0",
+}
+
+# A dictionary of settings of the charts of products' opinions (see app/charts.py).
+charts = {
+    # The amount of threads drawing charts at the same time.
+    "workers": int(os.environ.get("CENEO_CHART_WORKERS", 2)),
+    # Formats of the saved charts, e.g. "CENEO_CHART_FORMATS=png" saves only .png files.
+    "formats": os.environ.get("CENEO_CHART_FORMATS", "png,svg").split(","),
+}
+
+# A dictionary of settings of starting the app (see create_app() in app/__init__.py).
+startup = {
+    # Groups of modules imported when the app is created, e.g. "CENEO_PRELOAD=scraping,stats" ("all" imports every group).
+    # Other modules are imported when they're used for the first time.
+    "preload": [group.strip() for group in os.environ.get("CENEO_PRELOAD", "").split(",") if group.strip()],
+}
+
+# A dictionary of settings of the app's metrics (see app/metrics.py).
+metrics = {
+    # If set, a request with the "X-Profile" header equal to the "CENEO_PROFILE_TOKEN" environment variable returns
+    # a summary of the time spent in every function instead of the page. Not set by default, so profiling is turned off.
+    "profile_token": os.environ.get("CENEO_PROFILE_TOKEN", ""),
+    # The amount of functions listed in the summary.
+    "profile_lines": int(os.environ.get("CENEO_PROFILE_LINES", 40)),
+}
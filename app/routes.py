@@ -1,23 +1,46 @@
-from app import app
-# "BytesIO" is used for working with binary streams.
-from io import BytesIO
+# Blueprint             - a group of routes, registered in the app by create_app() (see app/__init__.py).
 # render_template       - used for creating a page based on the passed jinja template.
 # redirect              - used for redirecting to the passed URL.
-# url_for               - used for generating a URL for the passed subpage (e. g. url_for("extract") generates a URL pointing to the /extract page).
+# url_for               - used for generating a URL for the passed subpage (e. g. url_for("main.extract") generates a URL pointing to the /extract page).
 # request               - used for getting the data sent from the client to the server.
-# send_from_directory   - used for safely sending files from a specific directory.
-from flask import render_template, redirect, url_for, request, send_from_directory, Response
-# "os" package is used for reading/writing to files.
-import os
+# send_file             - used for sending a file.
+# jsonify               - used for returning JSON responses.
+# abort                 - used for returning an error page (e. g. 404 Not Found).
+from flask import Blueprint, render_template, redirect, url_for, request, send_file, Response, jsonify, abort
 # "json" package is used for working with .json files.
 import json
-# "pandas" package is used for generating and manipulating data and data structures.
-import pandas as pd
+# "os" package is used for reading/writing to files.
+import os
 # Import the Product class from the app/models directory.
 from app.models.product import Product
+# Import the queue of background extraction jobs.
+from app.jobs import queue
+# Import the function reading products from the catalogue of products.
+from app.catalogue import find_products, opinion_filters
+from app.parameters import catalogue as catalogue_parameters
+# Import the functions exporting opinions to downloadable files.
+from app import exports
+# Import the functions drawing charts of products' opinions.
+from app import charts
+# Import the app's metrics.
+from app import metrics
+# Import the function reading a single page of a product's opinions.
+from app.opinion_index import read_page, MAX_LIMIT
+
+# Every route of the website. Names of the routes start with "main." (e.g. url_for("main.extract")).
+main = Blueprint("main", __name__)
+
+# MIME types (types of files sent to the browser) of every supported format of downloadable files.
+mimetypes = {
+    "json": "application/json",
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
 
 # Route to the home page.
-@app.route('/')
+@main.route('/')
 def index():
     # Open the page based on the "index.html.jinja" template found in the ./templates directory.
     return render_template("index.html.jinja")
@@ -26,105 +49,172 @@ def index():
 # methods=["POST", "GET"] specify which HTTP request methods are allowed on the page.
 # GET method is used for opening the /extract subpage.
 # POST method is used for initiating a download of a product's information from an external website by using the HTML form.
-@app.route('/extract', methods=["POST", "GET"])
+@main.route('/extract', methods=["POST", "GET"])
 def extract():
     if request.method == "POST":
         # Get the value input in the HTML form (which should be a product's ID).
         product_id = request.form.get("product_id")
-        # Create an instance of the Product class.
-        product = Product(product_id)
-        # Extract the product's name from the scraped website.
-        product.extract_name()
-        # If the product name exists (if the previously input value is correct and points to an actual product on the scraped website),
-        if product.product_name:
-            # Extract opinions about the product, calculate statistics based on the opinions and create charts and graphs based on the statistics.
-            product.extract_opinions().calculate_stats().draw_charts()
-            # Save the product's opinions to a .json file.
-            product.export_opinions()
-            # Save the product's information to a .json file.
-            product.export_product()
-        else:
-            # If the product name does NOT exist,
+        # If nothing was input, display an error message.
+        if not product_id:
             error = "Darn it! This product ID does not exist, bucko!"
-            # display an error message.
             return render_template("extract.html.jinja", error=error)
-        # After downloading the product's information, redirect to the newly generated product's page (/product/<product_id>).
-        return redirect(url_for('product', product_id=product_id))
+        # Start extracting the product in the background. Downloading every opinion may take minutes,
+        # so instead of waiting, redirect to a page displaying the progress of the extraction.
+        # If the "only new opinions" checkbox was checked, download only the opinions posted since the last extraction.
+        job = queue.submit(product_id, incremental=bool(request.form.get("incremental")))
+        return redirect(url_for('main.job', job_id=job["job_id"]))
 
     else:
         # If the method is not POST (so it must be GET), open the page based on the "extract.html.jinja" template.
         return render_template("extract.html.jinja")
 
+# Route to a specific /extract/<job_id> page displaying the progress of an extraction.
+@main.route('/extract/<job_id>')
+def job(job_id):
+    job = queue.get(job_id)
+    # If there is no such job, display the "404 Not Found" error page.
+    if job is None:
+        abort(404)
+    # Open the "job.html.jinja" page. The page checks the job's progress using the /api/jobs/<job_id> route.
+    return render_template("job.html.jinja", job=job)
+
+# Route used for starting an extraction of a product in the background.
+# Returns the job's ID right away, the progress can be checked using the /api/jobs/<job_id> route.
+@main.route('/api/jobs', methods=["POST"])
+def submit_job():
+    # The product's ID may be sent both in an HTML form and in a JSON object.
+    data = request.form or request.get_json(silent=True) or {}
+    product_id = data.get("product_id")
+    # Any value other than a missing or empty one (or "false"/"0") turns on the incremental extraction.
+    incremental = str(data.get("incremental", "")).lower() not in ("", "0", "false")
+    # If no product ID was sent, return the "400 Bad Request" error.
+    if not product_id:
+        return jsonify(error="Missing product_id."), 400
+    job = queue.submit(str(product_id), incremental)
+    # "202 Accepted" means that the request was accepted, but isn't finished yet.
+    return jsonify(job), 202
+
+# Route used for checking the progress of an extraction.
+@main.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = queue.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found."), 404
+    return jsonify(job)
+
 # Route to the /products page.
-@app.route('/products')
+# Optional URL parameters: "q" - a part of the product's ID or name, "sort" - the column the products are sorted by,
+# "order" - "asc" or "desc", "page" - the number of the displayed page of products.
+@main.route('/products')
 def products():
-    products = []
+    query = request.args.get("q", "")
+    sort = request.args.get("sort", "product_id")
+    order = request.args.get("order", "asc")
+    # "type=int" converts the value to an integer (if the value isn't a number, the default value is used).
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = catalogue_parameters["per_page"]
 
-    for product_id in [filename.split(".")[0] for filename in os.listdir("app/opinions")]:
-        # Create an instance of the Product class based on the product's ID.
-        product = Product(product_id)
-        # Import product's properties to the "product" object without importing opinions.
-        product.import_product(import_opinions=False)
-        # Append properties about a single product to the "products" list.
-        products.append(product.stats_to_dict())
+    # Read only the products displayed on the requested page from the catalogue of products.
+    products, total = find_products(query, sort, order == "desc", (page - 1) * per_page, per_page)
+    # "-(-a // b)" divides rounding up.
+    pages = max(-(-total // per_page), 1)
 
     # Open the "products.html.jinja" page displaying a list of the passed products.
-    return render_template("products.html.jinja", products=products)
+    return render_template("products.html.jinja", products=products, query=query, sort=sort, order=order, page=page, pages=pages, total=total)
+
+# Route to the /metrics page, returning the app's metrics in the Prometheus text format (see app/metrics.py).
+@main.route('/metrics')
+def metrics_page():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 # Route to the /author page.
-@app.route('/author')
+@main.route('/author')
 def author():
     # Open the "author.html.jinja" page.
     return render_template("author.html.jinja")
 
 # Route to a specific /product/<product_id> page.
-@app.route('/product/<product_id>')
+@main.route('/product/<product_id>')
 # Pass a product's ID as a parameter.
 def product(product_id):
+    # If the product doesn't exist, display the "404 Not Found" error page.
+    if not os.path.exists(f"app/products/{product_id}.json"):
+        abort(404)
     # Create an instance of the Product class based on the passed product's ID.
     product = Product(product_id)
-    # Import product's properties and opinions to the "product" object.
-    product.import_product()
-    # Set the "product_dictionary" variable to a dictionary of the "product" object's properties.
-    product_dictionary = product.to_dict()
+    # Import only the product's properties. The opinions are loaded by the page, a part at a time, using the /api/product/<product_id>/opinions route.
+    product.import_product(import_opinions=False)
+    # Set the "product_dictionary" variable to a dictionary of the "product" object's statistics.
+    product_dictionary = product.stats_to_dict()
 
-    # Open the "product.html.jinja" page displaying specific product's properties and opinions based on the passed parameters.
-    return render_template("product.html.jinja", product=product_dictionary)
+    # Open the "product.html.jinja" page displaying specific product's properties based on the passed parameters.
+    return render_template("product.html.jinja", product=product_dictionary, limit=20)
+
+# Route used for reading a single page of a product's opinions.
+# Optional URL parameters: "offset" - the amount of opinions skipped, "limit" - the amount of opinions returned (at most 100),
+# "sort" - the attribute the opinions are sorted by ("-" before it sorts in descending order, e.g. "-useful"),
+# "filter" - the name of the filter the opinions must match (e.g. "with_pros").
+@main.route('/api/product/<product_id>/opinions')
+def opinions_page(product_id):
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 20, type=int), 1), MAX_LIMIT)
+    sort = request.args.get("sort", "position")
+    filter = request.args.get("filter") or None
+    # If the filter doesn't exist, return the "400 Bad Request" error.
+    if filter is not None and filter not in opinion_filters:
+        return jsonify(error=f"Unknown filter: {filter}."), 400
+    try:
+        opinions, total = read_page(product_id, sort.lstrip("-"), sort.startswith("-"), filter, offset, limit)
+    # If the product doesn't exist, return the "404 Not Found" error.
+    except FileNotFoundError:
+        return jsonify(error="Product not found."), 404
+    return jsonify(product_id=product_id, total=total, offset=offset, limit=limit, opinions=opinions)
 
 # Route to a specific /graphs/<product_id> page.
-@app.route('/graphs/<product_id>')
+@main.route('/graphs/<product_id>')
 # Pass product's ID as a parameter.
 def graphs(product_id):
+    # File names of the product's charts, if they were already drawn for the current opinions.
+    files = charts.current_charts(product_id)
+    if files is None:
+        # If the product doesn't exist, display the "404 Not Found" error page.
+        if not os.path.exists(f"app/products/{product_id}.json") or not os.path.exists(exports.opinions_path(product_id)):
+            abort(404)
+        # Otherwise draw the charts now (e.g. the product was extracted before the charts were drawn in the background).
+        product = Product(product_id)
+        product.import_product()
+        files = product.draw_charts().result()
     # Open the "graphs.html.jinja" page.
-    return render_template("graphs.html.jinja", product_id=product_id)
+    return render_template("graphs.html.jinja", product_id=product_id, files=files)
 
 # Route used for downloading files containing opinions.
-@app.route('/opinions/<product_id>.<extension>')
+@main.route('/opinions/<product_id>.<extension>')
 def download_opinions(product_id, extension):
+    # If the product doesn't exist (or the format isn't supported), display the "404 Not Found" error page.
+    if extension not in mimetypes or not os.path.exists(exports.opinions_path(product_id)):
+        abort(404)
+    if extension == "json":
+        # Return the .json file as an attachment. The path is relative to the current directory, like the paths of the other files.
+        return send_file(os.path.abspath(exports.opinions_path(product_id)), mimetype=mimetypes[extension], as_attachment=True, download_name=f"{product_id}.{extension}")
+
+    headers = {'Content-disposition': f'attachment; filename={product_id}.{extension}'}
+    # If the file was already created (and the opinions didn't change since then), return the saved file.
+    path = exports.export_path(product_id, extension)
+    if os.path.exists(path):
+        return send_file(os.path.abspath(path), mimetype=mimetypes[extension], as_attachment=True, download_name=f"{product_id}.{extension}")
+
     match extension:
-        case "json":
-            # Return a .json file from a specific directory as an attachment.
-            return send_from_directory("opinions/", f"{product_id}.{extension}", as_attachment=True)
-        case "csv":
-            # Return a .csv file.
-            return Response(
-                # Read a .json file as a pandas DataFrame and convert it to a CSV string.
-                # "index=False" disables writing row numbers in the first column.
-                pd.read_json(f'app/opinions/{product_id}.json').to_csv(encoding="UTF-8", index=False),
-                mimetype='text/csv',
-                headers={'Content-disposition': f'attachment; filename={product_id}.{extension}'})
-        case "xlsx":
-            # Create a binary stream.
-            byteIO = BytesIO()
-            # Read a .json file as a pandas DataFrame and write it in an excel format to the stream.
-            # "index=False" disables writing row numbers in the first column.
-            pd.read_json(f'app/opinions/{product_id}.json').to_excel(byteIO, index=False)
-            # Move to the start of the stream.
-            # Otherwise the returned file will have no data (will be empty).
-            byteIO.seek(0)
-
-            # Return an .xlsx file.
-            return Response(
-                byteIO,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                headers={'Content-disposition': f'attachment; filename={product_id}.{extension}'})
+        case "csv" | "ndjson":
+            # Return a text file sent in parts as they're created (and saved at the same time),
+            # so the whole file never has to be kept in memory.
+            chunks = exports.csv_chunks if extension == "csv" else exports.ndjson_chunks
+            return Response(exports.stream_export(path, chunks(exports.read_opinions(product_id))), mimetype=mimetypes[extension], headers=headers)
+        case "xlsx" | "parquet":
+            write = exports.write_xlsx if extension == "xlsx" else exports.write_parquet
+            try:
+                # Create and save the file, then return it.
+                exports.save_export(path, lambda temporary_path: write(exports.read_opinions(product_id), temporary_path))
+            # .parquet files require the "pyarrow" package, which doesn't have to be installed.
+            except ImportError:
+                return Response("The pyarrow package is required for .parquet files.", status=501)
+            return send_file(os.path.abspath(path), mimetype=mimetypes[extension], as_attachment=True, download_name=f"{product_id}.{extension}")
@@ -0,0 +1,349 @@
+# scraper.py is a module storing functions and classes used for downloading pages from the scraped website.
+# "random" package is used for randomizing waiting times between retries.
+import random
+# "re" package is used for working with regular expressions.
+import re
+# "time" package is used for measuring how long downloading takes.
+import time
+# "threading" package is used for synchronizing access to objects shared between threads.
+import threading
+# "ThreadPoolExecutor" runs functions in a pool of threads, so many pages can be downloaded at the same time.
+from concurrent.futures import ThreadPoolExecutor
+# "parsedate_to_datetime" converts dates used in HTTP headers (e.g. "Wed, 21 Oct 2015 07:28:00 GMT") to datetime objects.
+from email.utils import parsedate_to_datetime
+# "urlsplit" splits a URL into its parts (scheme, host, path, ...).
+from urllib.parse import urlsplit
+# "Requests" package is used for sending HTTP requests.
+import requests
+# "HTTPAdapter" lets us configure the pool of connections kept open by a requests.Session.
+from requests.adapters import HTTPAdapter
+from app.parameters import scraping, cache
+from app.cache import CachedPage, ResponseCache
+from app.metrics import request_seconds
+
+# A single session shared by every download. A session keeps connections open between requests,
+# so downloading the next page doesn't have to connect to the website again.
+_session = None
+# A lock makes sure that only one thread at a time can create the session.
+_session_lock = threading.Lock()
+# A dictionary of Host objects (see below). Keys are hosts (e.g. "www.ceneo.pl").
+_hosts = {}
+
+# The cache of downloaded pages, or None if the cache is turned off.
+response_cache = ResponseCache(cache["directory"], cache["ttl"], cache["max_size"]) if cache["enabled"] else None
+
+# A dictionary of counters describing every download so far: the amount of requests sent,
+# the amount of bytes downloaded, the total time spent waiting for responses (in seconds),
+# the amount of requests sent again ("retries"), "429 Too Many Requests" responses ("throttled"),
+# the total time spent waiting because of the rate limit ("throttled_seconds"), failed requests ("failures": server errors,
+# timeouts and broken connections), timeouts, the amount of times a circuit breaker was opened ("circuit_opened")
+# and requests not sent because a circuit breaker was open ("circuit_rejected").
+stats = {"requests": 0, "bytes": 0, "seconds": 0.0, "retries": 0, "throttled": 0, "throttled_seconds": 0.0,
+         "failures": 0, "timeouts": 0, "circuit_opened": 0, "circuit_rejected": 0}
+_stats_lock = threading.Lock()
+
+# Responses which are worth sending the request again: too many requests and temporary server errors.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def count(name, amount=1):
+    # Add "amount" to a download counter.
+    with _stats_lock:
+        stats[name] += amount
+
+# Raised when no request is sent because the host's circuit breaker is open.
+class CircuitOpenError(Exception):
+    pass
+
+# Limits the amount of requests sent per second using a "token bucket": every request takes a token, tokens are added
+# "rate" times per second and at most "burst" tokens can be saved. The rate adapts to the website: it grows slowly
+# while the website answers, and is halved when the website answers "429 Too Many Requests".
+class TokenBucket():
+    def __init__(self, rate=None, burst=None):
+        self.rate = scraping["rate"] if rate is None else rate
+        self.burst = burst or scraping["burst"]
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        # No requests are sent until this time (set by the "Retry-After" header).
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Wait until a request can be sent and return the waiting time (in seconds).
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                # A rate of 0 means that there is no limit (apart from "Retry-After").
+                elif self.rate <= 0:
+                    return waited
+                else:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    # The time until the next token is added.
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def success(self):
+        # The website answered, so slightly more requests can be sent.
+        with self.lock:
+            if self.rate > 0:
+                self.rate = min(scraping["max_rate"], self.rate + scraping["rate_increase"])
+
+    def throttle(self, retry_after=None):
+        # The website answered "429 Too Many Requests": halve the rate and, if the website said how long to wait, stop sending requests until then.
+        with self.lock:
+            if self.rate > 0:
+                self.rate = max(scraping["min_rate"], self.rate / 2)
+            self.tokens = 0
+            now = time.monotonic()
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            # Tokens aren't added while requests are paused.
+            self.updated = max(now, self.paused_until)
+
+# Stops sending requests to a host which doesn't work, instead of sending (and retrying) requests which will fail anyway.
+# "closed" - requests are sent, "open" - no requests are sent, "half-open" - a single request is sent to check if the host works again.
+# Every request let through must end with a call of success() or failure().
+class CircuitBreaker():
+    def __init__(self, failures=None, reset=None):
+        self.threshold = failures or scraping["circuit_failures"]
+        self.reset = scraping["circuit_reset"] if reset is None else reset
+        self.state = "closed"
+        # The amount of failed requests in a row.
+        self.failures = 0
+        # The time the breaker was opened, or the time the checking request was let through (in the "half-open" state).
+        self.opened = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        # Raise CircuitOpenError if no request can be sent at the moment.
+        with self.lock:
+            # If the host wasn't checked for "reset" seconds (or the checking request never finished), check it (again).
+            if self.state in ("open", "half-open") and time.monotonic() - self.opened >= self.reset:
+                # Let a single request through to check if the host works again.
+                self.state = "half-open"
+                self.opened = time.monotonic()
+                return
+            if self.state != "closed":
+                count("circuit_rejected")
+                raise CircuitOpenError(f"Too many failed requests, no requests are sent for {self.reset:.0f} s.")
+
+    def success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half-open" or (self.state == "closed" and self.failures >= self.threshold):
+                self.state = "open"
+                self.opened = time.monotonic()
+                count("circuit_opened")
+
+# Everything limiting the requests sent to a single host.
+class Host():
+    def __init__(self):
+        # Limits the amount of requests sent at the same time.
+        self.limit = threading.BoundedSemaphore(scraping["max_connections_per_host"])
+        # Limits the amount of requests sent per second.
+        self.bucket = TokenBucket()
+        self.breaker = CircuitBreaker()
+
+# Matches URLs of opinion pages, e.g. "https://www.ceneo.pl/12345/opinie-2".
+# The first group is everything before the page number, the second group is the page number.
+_page_number = re.compile(r"^(.*/opinie-)(\d+)$")
+
+def get_session():
+    global _session
+    with _session_lock:
+        # Create the session only once, the first time it's needed.
+        if _session is None:
+            session = requests.Session()
+            # Keep at most "max_connections_per_host" connections open to a single host.
+            # "pool_block=True" makes a thread wait for a free connection instead of opening an extra one.
+            adapter = HTTPAdapter(pool_maxsize=scraping["max_connections_per_host"], pool_block=True)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+def get_host(url):
+    # Return the Host object of the URL's host, creating it if the host is seen for the first time.
+    host = urlsplit(url).netloc
+    with _session_lock:
+        if host not in _hosts:
+            _hosts[host] = Host()
+        return _hosts[host]
+
+def retry_after(response):
+    # Return the amount of seconds the website asked to wait with the "Retry-After" header (a number of seconds or a date), or None.
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def backoff(attempt):
+    # Return the waiting time before the next retry: "backoff" seconds doubled after every attempt ("exponential backoff"),
+    # randomized between half and the whole time ("jitter"), so many threads don't send their retries at the same time.
+    delay = min(scraping["max_backoff"], scraping["backoff"] * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+def send(url, headers):
+    # Send a GET request to the "url" website and return the response. Requests are limited by the host's limits (see the Host class).
+    # Requests answered with "429" or a temporary server error, timed out or with a broken connection are sent again, at most "retries" times.
+    # Raises requests.HTTPError if the last response is still an error (or the website asks to wait longer than "max_retry_after"),
+    # requests.RequestException if the last request failed and CircuitOpenError if the host doesn't seem to work.
+    host = get_host(url)
+    for attempt in range(scraping["retries"] + 1):
+        last_attempt = attempt == scraping["retries"]
+        host.breaker.allow()
+        waited = host.bucket.acquire()
+        if waited:
+            count("throttled_seconds", waited)
+        try:
+            # Wait if too many requests are already being sent to the same host.
+            with host.limit:
+                start = time.perf_counter()
+                response = get_session().get(url, headers=headers, timeout=(scraping["connect_timeout"], scraping["read_timeout"]))
+                elapsed = time.perf_counter() - start
+        # A timeout, a broken connection or any other failed request (e.g. too many redirects). Every failure is reported
+        # to the circuit breaker, otherwise a failed checking request would leave it "half-open".
+        except requests.RequestException as error:
+            count("failures")
+            if isinstance(error, requests.Timeout):
+                count("timeouts")
+            host.breaker.failure()
+            # Only timeouts and broken connections (or broken transfers) are worth sending the request again.
+            retryable = isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
+            if last_attempt or not retryable:
+                raise
+            count("retries")
+            time.sleep(backoff(attempt))
+            continue
+        # Update the download counters.
+        request_seconds.observe(elapsed)
+        with _stats_lock:
+            stats["requests"] += 1
+            stats["bytes"] += len(response.content)
+            stats["seconds"] += elapsed
+
+        if response.status_code not in RETRY_STATUSES:
+            host.breaker.success()
+            host.bucket.success()
+            return response
+        delay = retry_after(response)
+        # Waiting longer than "max_retry_after" would block the extraction (and every other request to the host) for too long,
+        # so the request fails right away instead.
+        too_long = delay is not None and delay > scraping["max_retry_after"]
+        if too_long:
+            delay = scraping["max_retry_after"]
+        if response.status_code == 429:
+            # The website works, but too many requests were sent.
+            count("throttled")
+            host.breaker.success()
+            host.bucket.throttle(delay)
+        else:
+            count("failures")
+            host.breaker.failure()
+        if last_attempt or too_long:
+            response.raise_for_status()
+        count("retries")
+        # The rate limit makes the next request wait for the "Retry-After" time too.
+        time.sleep(max(backoff(attempt), delay or 0))
+
+def fetch(url):
+    # If the page was downloaded recently, use the saved page without sending any request.
+    cached = response_cache.get(url) if response_cache else None
+    if cached and cached.is_fresh(response_cache.ttl):
+        response_cache.count("hits")
+        return cached.body
+
+    # If the page was saved some time ago, ask the website to send it only if it has changed.
+    headers = cached.conditional_headers() if cached else {}
+    # Send a GET request to the "url" website (and send it again if it fails).
+    response = send(url, headers)
+
+    # "304 Not Modified" means that the saved page is still up to date.
+    if cached and response.status_code == 304:
+        response_cache.count("revalidations")
+        response_cache.refresh(cached)
+        return cached.body
+    if response_cache:
+        response_cache.count("misses")
+        # Save only successfully downloaded pages.
+        if response.status_code == 200:
+            response_cache.put(CachedPage(url, response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"), time.time()))
+    # Any other error (e.g. "404 Not Found") raises requests.HTTPError, so an error page is never mistaken for a page without opinions
+    # (or without a link to the next page, which would silently end the extraction).
+    response.raise_for_status()
+    # Return the HTML document found in the response.
+    return response.text
+
+# Matches the amount of opinions shown on the first page of a product, e.g. '<a class="product-review__link" ...><span>143</span> opinii</a>'.
+_opinions_total = re.compile(r'class="[^"]*\bproduct-review__link\b[^"]*"[^>]*>\s*<span>\s*(\d+)\s*</span>')
+
+def last_page_number(html):
+    # Return the number of the last page of opinions, calculated from the amount of opinions shown on the product's first page
+    # (None if the page doesn't show it).
+    match = _opinions_total.search(html)
+    if not match:
+        return None
+    # "-(-a // b)" divides rounding up.
+    return max(-(-int(match.group(1)) // scraping["opinions_per_page"]), 1)
+
+def predict_pages(url, amount, last_page=None):
+    # Return a list of URLs of at most "amount" opinion pages which will most likely come after the "url" page,
+    # but not after the "last_page" page (if it's known).
+    # e.g. predict_pages(".../12345/opinie-2", 2) returns [".../12345/opinie-3", ".../12345/opinie-4"].
+    match = _page_number.match(url)
+    # If the URL isn't a numbered opinion page, nothing can be predicted.
+    if not match:
+        return []
+    prefix, number = match.group(1), int(match.group(2))
+    return [f"{prefix}{page}" for page in range(number + 1, number + amount + 1) if last_page is None or page <= last_page]
+
+# Downloads opinion pages in the background, ahead of the page that is currently being parsed.
+# Pages are still handed out in the order they are asked for, so the opinions keep their order.
+class PagePrefetcher():
+    def __init__(self, workers=None):
+        # The amount of pages downloaded at the same time.
+        self.workers = workers or scraping["max_connections_per_host"]
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        # A dictionary of pages that are being downloaded (or already are). Keys are URLs, values are "Future" objects.
+        self.pages = {}
+        # The number of the last page of opinions (None if it isn't known). Pages after it are never predicted.
+        self.last_page = None
+
+    # __enter__ and __exit__ let a PagePrefetcher object be used in a "with" statement.
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        # Stop downloading pages that are no longer needed (e.g. predicted pages after the last page).
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pages.clear()
+
+    def get(self, url):
+        # Start downloading the requested page and the pages predicted to come after it (if they aren't downloading already).
+        for page_url in [url] + predict_pages(url, self.workers, self.last_page):
+            if page_url not in self.pages:
+                self.pages[page_url] = self.executor.submit(fetch, page_url)
+        # Wait until the requested page is downloaded and forget about it, so it doesn't take up memory.
+        return self.pages.pop(url).result()
@@ -0,0 +1,227 @@
+# storage.py is a module storing the binary format of saved opinions (app/opinions/<product_id>.bin files).
+# Opinions are saved column by column (every author, then every recommendation, ...) instead of opinion by opinion, so:
+#   - a single column (e.g. every opinion's stars) can be read without reading (and decoding) the content of the opinions,
+#   - a single opinion can be read using the offsets saved for every column, without reading the rest of the file,
+#   - the file is read with "mmap" (the operating system maps the file to memory and reads only the parts that are used).
+# The .json files are still saved next to the .bin files, they're the files downloaded by users.
+#
+# The file starts with the MAGIC bytes, the length of the header and the header: a JSON object with the amount of opinions
+# and the place of every part of every column in the file. Every column consists of:
+#   - "nulls": a byte for every opinion, 1 if the opinion's value is None,
+#   - "offsets": the number of the first byte of every value in "data" (and the end of the last value), as 64-bit integers,
+#   - "data": every value (encoded with UTF-8), one after another, each followed by a zero byte.
+# Columns of lists (pros and cons) also have "lengths": the number of the first item of every list (and the end of the last list)
+# in "data", where every item of every list is a separate value.
+# Columns with values other than text (e.g. numbers) are saved as JSON, every value separately.
+# "json" package is used for working with JSON objects.
+import json
+# "mmap" package is used for mapping files to memory.
+import mmap
+# "os" package is used for reading/writing to files.
+import os
+# "struct" package is used for converting numbers to bytes (and back).
+import struct
+# "numpy" package is used for reading arrays of numbers straight from the mapped file, without copying them.
+import numpy as np
+from app.utils import atomic_path
+
+# The first bytes of every .bin file of opinions. The last byte is the version of the format.
+MAGIC = b"CEOPN\x00\x00\x01"
+# The header's length is saved as a 32-bit unsigned integer ("<" - little-endian, "I" - unsigned int).
+HEADER_LENGTH = struct.Struct("<I")
+# Numbers in the file are little-endian 64-bit unsigned integers, no matter what computer saved the file.
+OFFSET_TYPE = np.dtype("<u8")
+# The byte separating values in "data".
+SEPARATOR = "\x00"
+
+def binary_path(product_id):
+    return f"app/opinions/{product_id}.bin"
+
+def column_type(values):
+    # Return the type of a column: "text" if every value is text (or None), "list" if every value is a list of texts (or None),
+    # otherwise "json". Texts containing the SEPARATOR are saved as JSON too.
+    def is_text(value):
+        return isinstance(value, str) and SEPARATOR not in value
+
+    if all(value is None or is_text(value) for value in values):
+        return "text"
+    if all(value is None or (isinstance(value, list) and all(map(is_text, value))) for value in values):
+        return "list"
+    return "json"
+
+def encode_values(values):
+    # Return the "offsets" and "data" of a list of texts. Every value is followed by a separator.
+    data = "".join(value + SEPARATOR for value in values).encode("UTF-8")
+    offsets = np.zeros(len(values) + 1, dtype=OFFSET_TYPE)
+    # The length of every value in bytes, plus 1 byte of the separator after it.
+    np.cumsum([len(value.encode("UTF-8")) + 1 for value in values], out=offsets[1:])
+    return offsets, data
+
+def write_opinions(path, opinions, columns):
+    # Save a list of dictionaries of opinions' attributes to a .bin file. "columns" are the keys of the dictionaries saved to the file.
+    parts = []
+    header = {"count": len(opinions), "columns": {}}
+    # "position" is the number of the first byte after the header of the next part of the file.
+    position = 0
+
+    def add(data):
+        # Add a part of the file and return its place in the file. Parts start at numbers divisible by 8, so arrays of numbers are aligned.
+        nonlocal position
+        padding = -position % 8
+        parts.append(b"\x00" * padding)
+        parts.append(data)
+        position += padding
+        place = [position, len(data)]
+        position += len(data)
+        return place
+
+    for column in columns:
+        values = [opinion.get(column) for opinion in opinions]
+        kind = column_type(values)
+        nulls = np.array([value is None for value in values], dtype=np.uint8)
+        if kind == "list":
+            items = [item for value in values for item in (value or [])]
+            lengths = np.zeros(len(values) + 1, dtype=OFFSET_TYPE)
+            np.cumsum([len(value or []) for value in values], out=lengths[1:])
+        else:
+            items = [(value or "") if kind == "text" else json.dumps(value, ensure_ascii=False) for value in values]
+        offsets, data = encode_values(items)
+        header["columns"][column] = {"type": kind, "nulls": add(nulls.tobytes()), "offsets": add(offsets.tobytes()), "data": add(data)}
+        if kind == "list":
+            header["columns"][column]["lengths"] = add(lengths.tobytes())
+
+    header = json.dumps(header).encode("UTF-8")
+    # Places of the parts are counted from the end of the header, which is padded to a number of bytes divisible by 8.
+    header += b" " * (-(len(MAGIC) + HEADER_LENGTH.size + len(header)) % 8)
+    # Write to a temporary file first, so a half-written file is never read.
+    # The old file may still be mapped to memory by a reader, which Windows doesn't allow to replace, see replace_file() in app/utils.py.
+    with atomic_path(path) as temporary_path:
+        with open(temporary_path, "wb") as file:
+            file.write(MAGIC)
+            file.write(HEADER_LENGTH.pack(len(header)))
+            file.write(header)
+            for part in parts:
+                file.write(part)
+
+# Class representation of a .bin file of opinions.
+# Usage: "with OpinionStore(path) as store:", then store[number] (a single opinion), store.column("stars") (every opinion's stars)
+# or list(store) (every opinion).
+class OpinionStore():
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            # An empty file can't be mapped to memory.
+            if os.fstat(file.fileno()).st_size == 0:
+                raise ValueError(f"{path} is empty.")
+            # The mapping stays open after the file is closed.
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} isn't a file of opinions.")
+        (length,) = HEADER_LENGTH.unpack_from(self.map, len(MAGIC))
+        self.start = len(MAGIC) + HEADER_LENGTH.size + length
+        header = json.loads(self.map[len(MAGIC) + HEADER_LENGTH.size:self.start])
+        self.count = header["count"]
+        self.columns = header["columns"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        try:
+            self.map.close()
+        # The mapping can't be closed while arrays read from it still exist. It's closed when they're removed instead.
+        except BufferError:
+            pass
+
+    def __len__(self):
+        return self.count
+
+    def part(self, column, name):
+        # Return a part of a column as a "memoryview" of the mapped file (no bytes are copied).
+        start, length = self.columns[column][name]
+        return memoryview(self.map)[self.start + start:self.start + start + length]
+
+    def array(self, column, name, dtype):
+        # Return a part of a column as a numpy array read straight from the mapped file.
+        return np.frombuffer(self.part(column, name), dtype=dtype)
+
+    def value(self, column, number):
+        # Return the value of a single opinion (the opinion with the passed number) in a column.
+        kind = self.columns[column]["type"]
+        if self.array(column, "nulls", np.uint8)[number]:
+            return None
+        offsets = self.array(column, "offsets", OFFSET_TYPE)
+        data = self.part(column, "data")
+        # Numbers read from the file are numpy integers, int() converts them to Python integers.
+
+        def item(index):
+            # The value without the separator after it.
+            return bytes(data[int(offsets[index]):int(offsets[index + 1]) - 1]).decode("UTF-8")
+
+        if kind == "list":
+            lengths = self.array(column, "lengths", OFFSET_TYPE)
+            return [item(index) for index in range(int(lengths[number]), int(lengths[number + 1]))]
+        return item(number) if kind == "text" else json.loads(item(number))
+
+    def column(self, column):
+        # Return a list of values of every opinion in a column. Other columns aren't read at all.
+        kind = self.columns[column]["type"]
+        # Every value is decoded at once and split at the separators, which is much faster than decoding the values one by one.
+        data = bytes(self.part(column, "data")).decode("UTF-8")
+        # The data ends with a separator, so the last item of the split is empty.
+        items = data.split(SEPARATOR)[:-1]
+        if kind == "list":
+            lengths = self.array(column, "lengths", OFFSET_TYPE).tolist()
+            values = [items[start:end] for start, end in zip(lengths, lengths[1:])]
+        elif kind == "json":
+            values = [json.loads(item) for item in items]
+        else:
+            values = items
+        # Replace the values of opinions with no value with None.
+        for number in np.flatnonzero(self.array(column, "nulls", np.uint8)).tolist():
+            values[number] = None
+        return values
+
+    def __getitem__(self, number):
+        # Return a dictionary of attributes of a single opinion.
+        if not 0 <= number < self.count:
+            raise IndexError("opinion number out of range")
+        return {column: self.value(column, number) for column in self.columns}
+
+    def rows(self, columns=None):
+        # Return an iterator of tuples of values of every opinion in the passed columns (every column by default).
+        # Every column is read only once.
+        return zip(*[self.column(column) for column in columns or self.columns])
+
+    def __iter__(self):
+        # Return a generator of dictionaries of attributes of every opinion.
+        columns = list(self.columns)
+        for values in self.rows(columns):
+            yield dict(zip(columns, values))
+
+def read_store(product_id):
+    # Return an OpinionStore of the product's opinions, or None if there is no .bin file of them
+    # (or it's older than the .json file, e.g. because the .json file was replaced by hand).
+    path = binary_path(product_id)
+    try:
+        if os.stat(path).st_mtime_ns < os.stat(f"app/opinions/{product_id}.json").st_mtime_ns:
+            return None
+        return OpinionStore(path)
+    except (FileNotFoundError, ValueError):
+        return None
+
+# Running this module (in the ./CeneoWebScraper directory) with "python -m app.storage" saves the opinions
+# of every product found in the app/opinions directory in the binary format.
+if __name__ == "__main__":
+    from app.exports import columns
+    count = 0
+    for filename in os.listdir("app/opinions") if os.path.exists("app/opinions") else []:
+        if filename.endswith(".json"):
+            with open(f"app/opinions/{filename}", "r", encoding="UTF-8") as jf:
+                opinions = json.load(jf)
+            write_opinions(binary_path(filename[:-len(".json")]), opinions, columns)
+            count += 1
+    print(f"Opinions of {count} products saved in the binary format.")
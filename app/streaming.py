@@ -0,0 +1,107 @@
+# streaming.py is a module storing the streaming parser of pages of opinions.
+# Instead of building a Beautiful Soup tree of the whole page (navigation, offers, scripts, ...) only to find the opinions in it,
+# the page is read piece by piece and a (small) tree is built only for every single opinion and the link to the next page.
+# "HTMLParser" is Python's built-in HTML parser. It reads HTML documents piece by piece and calls a method for every tag it finds.
+from html.parser import HTMLParser
+# "Beautiful Soup" package is used for parsing HTML documents.
+from bs4 import BeautifulSoup
+from app.models.opinion import Opinion
+from app.parameters import html_parser
+
+# The amount of characters of a page read at once.
+CHUNK_SIZE = 64 * 1024
+
+class ReviewParser(HTMLParser):
+    def __init__(self):
+        # "convert_charrefs=False" keeps character references (e.g. "&amp;") as they are, so an opinion's HTML code can be copied without changes.
+        super().__init__(convert_charrefs=False)
+        # HTML code of every opinion found so far, which wasn't returned by pop_reviews() yet.
+        self.reviews = []
+        # The link to the next page of opinions (None if there is no next page).
+        self.next_page = None
+        # Parts of the HTML code of the opinion being read at the moment (None if no opinion is being read),
+        # and the amount of <div> tags opened inside the opinion and not closed yet (the opinion itself included).
+        self.parts = None
+        self.depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.parts is not None:
+            # get_starttag_text() returns the tag exactly as it's written in the page.
+            self.parts.append(self.get_starttag_text())
+            if tag == "div":
+                self.depth += 1
+            return
+        classes = (dict(attrs).get("class") or "").split()
+        # The beginning of an opinion: a "div" HTML tag with a class attribute equal to "js_product-review".
+        if tag == "div" and "js_product-review" in classes:
+            self.parts = [self.get_starttag_text()]
+            self.depth = 1
+        # The (first) link to the next page of opinions.
+        elif tag == "a" and "pagination__next" in classes and self.next_page is None:
+            self.next_page = dict(attrs).get("href")
+
+    def handle_startendtag(self, tag, attrs):
+        # A self-closing tag, e.g. <br/>.
+        if self.parts is not None:
+            self.parts.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        if self.parts is None:
+            return
+        self.parts.append(f"</{tag}>")
+        if tag == "div":
+            self.depth -= 1
+            # The opinion's own <div> tag was closed, so the whole opinion was read.
+            if self.depth == 0:
+                self.reviews.append("".join(self.parts))
+                self.parts = None
+
+    def handle_data(self, data):
+        if self.parts is not None:
+            self.parts.append(data)
+
+    def handle_entityref(self, name):
+        # A named character reference, e.g. "&amp;".
+        if self.parts is not None:
+            self.parts.append(f"&{name};")
+
+    def handle_charref(self, name):
+        # A numeric character reference, e.g. "&#243;".
+        if self.parts is not None:
+            self.parts.append(f"&#{name};")
+
+    def handle_comment(self, data):
+        if self.parts is not None:
+            self.parts.append(f"<!--{data}-->")
+
+    def pop_reviews(self):
+        # Return the HTML code of the opinions found since the last call and forget them.
+        reviews, self.reviews = self.reviews, []
+        return reviews
+
+def review_to_opinion(review):
+    # Create an Opinion object from the HTML code of a single opinion.
+    return Opinion().extract_opinion(BeautifulSoup(review, html_parser).select_one("div.js_product-review"))
+
+# The "chunks" parameter is an iterable of consecutive pieces of an HTML document of a single page of opinions.
+# The "parser" parameter is a ReviewParser object. After the generator is exhausted, its "next_page" attribute
+# is the link to the next page of opinions.
+def stream_opinions(chunks, parser):
+    # Return a generator of Opinion objects, created as soon as each opinion is read.
+    for chunk in chunks:
+        parser.feed(chunk)
+        for review in parser.pop_reviews():
+            yield review_to_opinion(review)
+    parser.close()
+    for review in parser.pop_reviews():
+        yield review_to_opinion(review)
+
+def split_into_chunks(html):
+    # Return a generator of consecutive pieces of the HTML document, "CHUNK_SIZE" characters each.
+    return (html[start:start + CHUNK_SIZE] for start in range(0, len(html), CHUNK_SIZE))
+
+# Returns the same values as the parse_page() function in app/models/product.py, without building a tree of the whole page.
+def parse_page_streaming(html):
+    parser = ReviewParser()
+    opinions = list(stream_opinions(split_into_chunks(html), parser))
+    return opinions, parser.next_page
@@ -1,4 +1,58 @@
 # utils.py is a module storing functions imported and used by other modules, but does nothing on its own.
+# "os" package is used for reading/writing to files.
+import os
+# "re" package is used for working with regular expressions.
+import re
+# "tempfile" package is used for creating temporary files with unique names.
+import tempfile
+# "time" package is used for waiting before trying to replace a file again.
+import time
+# "contextmanager" turns a generator function into a function which can be used in a "with" statement.
+from contextlib import contextmanager
+# Beautiful Soup (and its CSS selector engine, "Soup Sieve") takes a long time to import, so it's imported only by the functions using it.
+# Modules which only save files (e.g. app/storage.py or app/charts.py) can use this module without importing it.
+
+# The amount of times replacing a file is tried and the time (in seconds) between the tries (see replace_file()).
+REPLACE_ATTEMPTS = 20
+REPLACE_DELAY = 0.25
+# Permissions of the saved files: the same as the permissions of files created by open(). Temporary files are created only readable
+# by their owner, so they're given these permissions before replacing the saved file.
+# "os.umask()" can only be read by changing it, so it's changed back right away.
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+def replace_file(source, destination):
+    # Move the "source" file to "destination", replacing the file there (like os.replace()).
+    # On Windows a file can't be replaced while it's open (e.g. being downloaded) or mapped to memory (see app/storage.py),
+    # so replacing it is tried again for a few seconds before PermissionError is raised.
+    for attempt in range(REPLACE_ATTEMPTS):
+        try:
+            os.replace(source, destination)
+            return
+        except PermissionError:
+            if attempt == REPLACE_ATTEMPTS - 1:
+                raise
+            time.sleep(REPLACE_DELAY)
+
+# Usage: "with atomic_path(path) as temporary_path:", then write the file to "temporary_path".
+# The file at "path" is replaced only after the whole file is written, so a half-written file is never read (or sent).
+# If writing the file fails, the temporary file is removed and the file at "path" is left unchanged.
+@contextmanager
+def atomic_path(path):
+    # The temporary file is created in the same directory, because a file can be moved without copying it only within a single disk.
+    # Its name is unique even if many processes (e.g. workers of a server) save the same file at the same time,
+    # and ends with ".tmp", so it's never mistaken for a saved file.
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    os.close(descriptor)
+    try:
+        yield temporary_path
+        os.chmod(temporary_path, FILE_MODE)
+        replace_file(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
 # The get_item() function uses Beautiful Soup library to parse HTML tags.
 def get_item(ancestor, selector, attribute=None, return_list=False):
     try:
@@ -15,3 +69,69 @@ def get_item(ancestor, selector, attribute=None, return_list=False):
     # If a wrong attribute value or type value was input, return nothing.
     except (AttributeError, TypeError):
         return None
+
+# Matches the last part of a CSS selector, describing the selected tag, e.g. "time:nth-child(1)" in "span.user-post__published > time:nth-child(1)".
+# The first group is the name of the selected tag (e.g. "time"), the second group is the rest of the description (e.g. ":nth-child(1)").
+_selected_tag = re.compile(r"(?:^|[\s>~+])([a-zA-Z][\w-]*)?([^\s>~+]*)$")
+# Matches the classes in a part of a CSS selector, e.g. "review-feature__item" in "div.review-feature__item".
+_selected_class = re.compile(r"\.([\w-]+)")
+
+# The "selectors" parameter is a dictionary in the same format as the "selectors" dictionary in parameters.py.
+def compile_selectors(selectors):
+    # Return a list of (key, compiled selector, classes, attribute, return_list) tuples grouped in a dictionary by the name of the selected tag
+    # (e.g. "span" or "time"), so only the selectors able to match a tag have to be checked while looking through the tags.
+    # "classes" is a set of classes the selected tag must have, checked before the (much slower) compiled selector.
+    # Selectors which don't select tags with a specific name are stored under the None key.
+    # "Soup Sieve" package is the CSS selector engine used by Beautiful Soup.
+    import soupsieve
+    compiled = {}
+    for key, (selector, *options) in selectors.items():
+        # Fill the missing options with their default values (the same as the default values of the get_item() function).
+        attribute, return_list = (options + [None, False])[:2]
+        match = _selected_tag.search(selector)
+        name = match.group(1).lower() if match and match.group(1) else None
+        # Classes inside "[...]" (attribute selectors) or ":...(...)" (pseudo-classes) are skipped, they don't have to be the tag's classes.
+        classes = set(_selected_class.findall(re.sub(r"\[.*?\]|\(.*?\)", "", match.group(2)))) if match else set()
+        compiled.setdefault(name, []).append((key, soupsieve.compile(selector), classes, attribute, return_list))
+    return compiled
+
+# The extract_items() function returns the same values as calling get_item() once for every selector,
+# but looks through the ancestor's tags only once (get_item() looks through them once per selector).
+# The "compiled" parameter is a dictionary returned by the compile_selectors() function.
+def extract_items(ancestor, compiled):
+    # "Tag" is Beautiful Soup's representation of an HTML tag.
+    from bs4 import Tag
+    # The first found tag (or a list of every found tag, if return_list is True) of every selector.
+    found = {key: [] if return_list else None for selectors in compiled.values() for key, _, _, _, return_list in selectors}
+    wildcard = compiled.get(None, [])
+    # "descendants" goes through every tag (and text) inside the ancestor in the same order as they appear in the HTML document.
+    for tag in ancestor.descendants:
+        if not isinstance(tag, Tag):
+            continue
+        candidates = compiled.get(tag.name, []) + wildcard
+        if not candidates:
+            continue
+        tag_classes = tag.get("class") or ()
+        for key, selector, classes, _, return_list in candidates:
+            # Skip selectors which already found their (only) tag and tags without the selected classes.
+            if (return_list or found[key] is None) and classes.issubset(tag_classes) and selector.match(tag):
+                if return_list:
+                    found[key].append(tag)
+                else:
+                    found[key] = tag
+
+    items = {}
+    for selectors in compiled.values():
+        for key, _, _, attribute, return_list in selectors:
+            tag = found[key]
+            if return_list:
+                # A list of stripped texts of every found tag.
+                items[key] = [item.get_text().strip() for item in tag]
+            elif tag is None:
+                # Nothing was found, just like get_item() returns None.
+                items[key] = None
+            elif attribute:
+                items[key] = tag[attribute]
+            else:
+                items[key] = tag.get_text().strip()
+    return items
@@ -0,0 +1,193 @@
+# ceneo_stub.py is a local stand-in for the ceneo.pl website. It serves canned product pages with opinions,
+# so the scraper can be run (and measured) without sending a single request to the real website.
+#
+# Usage (in the ./CeneoWebScraper directory):
+#     python -m benchmarks.ceneo_stub --port 8000
+#     export CENEO_URL=http://127.0.0.1:8000
+#
+# Every numeric product ID exists. The amount of opinion pages is the product ID modulo 1000
+# (e.g. product "40" has 40 pages, product "1500" has 500 pages), but every product has at least one page.
+# Non-numeric product IDs don't exist - their page has no product name, just like on the real website.
+#
+# Recorded pages (see benchmarks/fixtures.py) are served instead of the generated ones with "--fixtures {directory}".
+#
+# The server can also behave like a busy website: "--rate 10" answers "429 Too Many Requests" (with a "Retry-After" header)
+# to requests above 10 per second, "--failures 0.1" answers "503 Service Unavailable" to 10% of requests.
+# "random" package is used for generating (repeatable) opinions.
+import random
+# "re" package is used for working with regular expressions.
+import re
+# "argparse" package is used for reading command-line arguments.
+import argparse
+# "hashlib" package is used for generating ETags of the pages.
+import hashlib
+# "threading" package is used for running the server in the background.
+import threading
+# "time" package is used for limiting the amount of requests per second.
+import time
+# "http.server" package is Python's built-in HTTP server.
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# The amount of opinions shown on a single page.
+OPINIONS_PER_PAGE = 10
+
+# Matches the paths of product pages ("/12345") and opinion pages ("/12345/opinie-2").
+_path = re.compile(r"^/(?P<product_id>[^/?#]+)(?:/opinie-(?P<page>\d+))?/?$")
+
+_authors = ["Jan", "Anna", "a...k", "Użytkownik Ceneo", "Piotr", "Zofia", "m...z"]
+_words = ["produkt", "działa", "świetnie", "polecam", "cena", "jakość", "bateria", "szybko", "ekran", "dźwięk",
+          "wygodny", "solidny", "niestety", "po", "miesiącu", "zepsuł", "się", "bardzo", "dobry", "zakup"]
+_features = ["jakość wykonania", "cena", "wygoda", "wydajność", "wygląd", "głośna praca", "krótki czas pracy", "waga"]
+
+def page_count(product_id):
+    # Return the amount of opinion pages of a product.
+    return max(int(product_id) % 1000, 1)
+
+def render_opinion(product_id, number, generator):
+    # Return the HTML code of a single opinion, using the same tags and classes as the real website.
+    stars = generator.choice(["0,5", "1", "1,5", "2", "2,5", "3", "3,5", "4", "4,5", "5"])
+    recommendation = generator.choice(['<em class="recommended">Polecam</em>', '<em class="not-recommended">Nie polecam</em>', ""])
+    purchased = '<time datetime="2022-12-01 10:00:00">kupiono 2 miesiące temu</time>' if generator.random() < 0.7 else ""
+    pros = "".join(f'<div class="review-feature__item">{feature}</div>' for feature in generator.sample(_features, generator.randint(0, 3)))
+    cons = "".join(f'<div class="review-feature__item">{feature}</div>' for feature in generator.sample(_features, generator.randint(0, 2)))
+    content = " ".join(generator.choice(_words) for _ in range(generator.randint(5, 80)))
+    return f"""
+    <div class="user-post user-post__card js_product-review" data-entry-id="{product_id}{number:06d}" data-product-id="{product_id}">
+        <div class="user-post__header">
+            <span class="user-post__author-name">{generator.choice(_authors)}</span>
+            <span class="user-post__author-recomendation">{recommendation}</span>
+            <span class="user-post__score"><span class="user-post__score-count">{stars}/5</span></span>
+            <span class="user-post__published"><time datetime="2023-0{generator.randint(1, 9)}-1{generator.randint(0, 9)} 12:00:00">wystawiono 1 miesiąc temu</time>{purchased}</span>
+        </div>
+        <div class="user-post__content">
+            <div class="user-post__text">{content}</div>
+            <div class="review-feature">
+                <div class="review-feature__col"><div class="review-feature__title review-feature__title--positives">Zalety</div>{pros}</div>
+                <div class="review-feature__col"><div class="review-feature__title review-feature__title--negatives">Wady</div>{cons}</div>
+            </div>
+        </div>
+        <div class="user-post__footer">
+            <button class="vote-yes js_product-review-vote" data-icon="&#xe007;"><span>{generator.randint(0, 50)}</span></button>
+            <button class="vote-no js_product-review-vote"><span>{generator.randint(0, 20)}</span></button>
+        </div>
+    </div>"""
+
+def render_page(product_id, page=1):
+    # Return the HTML code of an opinion page of a product, or None if the page doesn't exist.
+    if not product_id.isdigit():
+        return "<html><head><title>Ceneo</title></head><body><h1>Nie znaleziono produktu</h1></body></html>"
+    pages = page_count(product_id)
+    if page > pages:
+        return None
+    # Seed the random number generator with the product ID and the page number, so the same page always has the same opinions.
+    generator = random.Random(f"{product_id}/{page}")
+    opinions = "".join(render_opinion(product_id, (page - 1) * OPINIONS_PER_PAGE + number, generator) for number in range(OPINIONS_PER_PAGE))
+    pagination = f'<a class="pagination__item pagination__next" href="/{product_id}/opinie-{page + 1}">Następna</a>' if page < pages else ""
+    # Filler imitating the parts of the real page that the scraper doesn't need (navigation, offers, scripts).
+    filler = "".join(f'<li class="offer"><a href="/Click/Offer/{number}">Oferta {number}</a><span class="price">{number},99 zł</span></li>' for number in range(200))
+    return f"""<!DOCTYPE html>
+<html lang="pl">
+<head><meta charset="utf-8"><title>Produkt {product_id} - Opinie - Ceneo.pl</title><script>var data = {{"product": {product_id}}};</script></head>
+<body>
+    <nav class="main-navigation"><ul>{filler[:5000]}</ul></nav>
+    <div class="product-top">
+        <div class="product-top__product-info"><h1 class="product-top__product-info__name js_product-h1-link">Produkt testowy {product_id}</h1>
+            <a class="product-review__link link link--accent js_reviews-link" href="#tab=reviews"><span>{pages * OPINIONS_PER_PAGE}</span> opinii</a></div>
+    </div>
+    <ul class="offers">{filler}</ul>
+    <div class="js_product-reviews">{opinions}</div>
+    <div class="pagination">{pagination}</div>
+    <script>window.analytics = [];</script>
+</body>
+</html>"""
+
+class CeneoStubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # Count every request (see benchmarks/prefetch_check.py).
+        with self.server.lock:
+            self.server.requests += 1
+        # Behave like a busy website (see the "rate" and "failures" attributes of the server).
+        if not self.server.allow():
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.end_headers()
+            return
+        if self.server.failures and self.server.random.random() < self.server.failures:
+            self.send_error(503)
+            return
+        match = _path.match(self.path)
+        body = self.server.page(match.group("product_id"), int(match.group("page") or 1)) if match else None
+        if body is None:
+            self.send_error(404)
+            return
+        body = body.encode("UTF-8")
+        # The pages never change, so the ETag (a "version" of a page) is simply a hash of the page.
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        # If the client already has the current version of the page, don't send it again.
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Don't print a line for every request.
+        pass
+
+class CeneoStubServer(ThreadingHTTPServer):
+    # "rate" is the maximum amount of requests per second (0 - no limit), "failures" is the fraction of requests answered with an error.
+    # "fixtures" is a directory of recorded pages, served instead of the generated pages of the recorded products.
+    def __init__(self, address, rate=0, failures=0.0, fixtures=None):
+        super().__init__(address, CeneoStubHandler)
+        self.fixtures = fixtures
+        # The amount of requests received so far.
+        self.requests = 0
+        self.rate = rate
+        self.failures = failures
+        self.random = random.Random(0)
+        # Requests are limited with a "token bucket" holding at most 1 second of requests.
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def page(self, product_id, page):
+        # Return the recorded page if the product was recorded, otherwise the generated page (None if the page doesn't exist).
+        # Imported here, because benchmarks/fixtures.py imports this module.
+        from benchmarks.fixtures import get_page
+        return get_page(self.fixtures, product_id, page)
+
+    def allow(self):
+        # Return True if the request doesn't exceed the limit of requests per second.
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+def serve_in_background(port=0, rate=0, failures=0.0, fixtures=None):
+    # Start the server in a background thread and return it. "port=0" picks any free port.
+    # The server's address is available as f"http://127.0.0.1:{server.server_port}".
+    server = CeneoStubServer(("127.0.0.1", port), rate, failures, fixtures)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve canned Ceneo product pages.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--rate", type=float, default=0, help="maximum amount of requests per second, answered with 429 above it (default: no limit)")
+    parser.add_argument("--failures", type=float, default=0.0, help="fraction of requests answered with 503 (default: 0)")
+    parser.add_argument("--fixtures", help="directory of recorded pages served instead of the generated ones")
+    arguments = parser.parse_args()
+    print(f"Serving canned Ceneo pages at http://127.0.0.1:{arguments.port}")
+    CeneoStubServer(("127.0.0.1", arguments.port), arguments.rate, arguments.failures, arguments.fixtures).serve_forever()
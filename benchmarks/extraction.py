@@ -0,0 +1,77 @@
+# extraction.py measures how many opinions per second are extracted from pages of opinions
+# by the old extraction (one get_item() call per selector) and by the new one (compiled selectors, one pass over the tags),
+# with every available HTML parser. It also checks that every way returns exactly the same opinions.
+#
+# Usage (in the ./CeneoWebScraper directory):
+#     python -m benchmarks.extraction                      (uses pages generated by the stand-in server)
+#     python -m benchmarks.extraction saved_page.html ...  (uses saved pages)
+# "argparse" package is used for reading command-line arguments.
+import argparse
+# "time" package is used for measuring how long the extraction takes.
+import time
+# "find_spec" checks if a package is installed without importing it.
+from importlib.util import find_spec
+from bs4 import BeautifulSoup
+from app.models.opinion import Opinion
+from app.parameters import selectors
+from app.utils import get_item
+from benchmarks.ceneo_stub import render_page
+
+def extract_old(tags):
+    # The extraction used before the selectors were compiled: a separate search of the opinion's tags for every selector.
+    opinions = []
+    for tag in tags:
+        opinion = Opinion()
+        for key, value in selectors.items():
+            setattr(opinion, key, get_item(tag, *value))
+        opinion.opinion_id = tag["data-entry-id"]
+        opinions.append(opinion.to_dict())
+    return opinions
+
+def extract_new(tags):
+    # The current extraction: compiled selectors, a single pass over the opinion's tags.
+    return [Opinion().extract_opinion(tag).to_dict() for tag in tags]
+
+def parse(pages, parser):
+    # Return a list of opinions' HTML tags found in the pages.
+    return [tag for html in pages for tag in BeautifulSoup(html, parser).select("div.js_product-review")]
+
+def best_time(function, repeat):
+    # Return the result of the function and the shortest of "repeat" run times (in seconds).
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the speed of the old and the new opinion extraction.")
+    parser.add_argument("pages", nargs="*", help="saved HTML pages of opinions (default: pages generated by the stand-in server)")
+    parser.add_argument("-n", "--count", type=int, default=20, help="amount of generated pages (default: 20)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="amount of runs, the best one is reported (default: 3)")
+    arguments = parser.parse_args()
+
+    if arguments.pages:
+        pages = []
+        for path in arguments.pages:
+            with open(path, "r", encoding="UTF-8") as file:
+                pages.append(file.read())
+    else:
+        pages = [render_page("999", page) for page in range(1, arguments.count + 1)]
+
+    parsers = ["html.parser"] + (["lxml"] if find_spec("lxml") else [])
+    reference = extract_old(parse(pages, "html.parser"))
+    print(f"{len(pages)} pages, {len(reference)} opinions")
+    print(f"{'extraction':<11} {'parser':<12} {'with parsing':>16} {'extraction only':>18}")
+    for html_parser in parsers:
+        tags, parsing = best_time(lambda: parse(pages, html_parser), arguments.repeat)
+        for name, function in [("old", extract_old), ("new", extract_new)]:
+            opinions, extraction = best_time(lambda: function(tags), arguments.repeat)
+            # The output must be the same as the output of the old extraction with "html.parser".
+            identical = "identical" if opinions == reference else "DIFFERENT"
+            print(f"{name:<11} {html_parser:<12} {len(opinions) / (parsing + extraction):10.1f} op/s {len(opinions) / extraction:12.1f} op/s  ({identical})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# fixtures.py stores the products measured by the benchmarks (benchmarks/suite.py) and records pages of opinions
+# (e.g. from the real website), so the benchmarks can be run against real pages instead of the pages generated by the stand-in server.
+# Every page is saved as a compressed file: {directory}/{product ID}/{page number}.html.gz.
+#
+# Usage (in the ./CeneoWebScraper directory):
+#     python -m benchmarks.fixtures --url https://www.ceneo.pl --directory recorded_pages {product IDs}
+#
+# The saved pages are served by the stand-in server with "python -m benchmarks.ceneo_stub --fixtures recorded_pages"
+# and used by the benchmarks with "python -m benchmarks.suite --fixtures recorded_pages".
+# "argparse" package is used for reading command-line arguments.
+import argparse
+# "gzip" package is used for compressing the saved pages.
+import gzip
+# "hashlib" package is used for calculating the fingerprint of the measured pages.
+import hashlib
+# "os" package is used for reading/writing to files.
+import os
+from benchmarks.ceneo_stub import render_page
+
+# Products measured by benchmarks/suite.py. By default their pages are generated by the stand-in server,
+# which always generates exactly the same pages for the same product (see benchmarks/ceneo_stub.py).
+corpus = {
+    "small": "100003",
+    "medium": "100040",
+    "large": "1500",
+}
+
+def page_path(directory, product_id, page):
+    return os.path.join(directory, product_id, f"{page}.html.gz")
+
+def is_recorded(directory, product_id):
+    # Return True if pages of the product were recorded in the directory.
+    return bool(directory) and os.path.isdir(os.path.join(directory, product_id))
+
+def load_page(directory, product_id, page):
+    # Return the recorded page of opinions, or None if it wasn't recorded.
+    try:
+        with gzip.open(page_path(directory, product_id, page), "rt", encoding="UTF-8") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+def get_page(directory, product_id, page):
+    # Return the page served by the stand-in server: the recorded page if the product was recorded, otherwise the generated page
+    # (None if the page doesn't exist).
+    if is_recorded(directory, product_id):
+        return load_page(directory, product_id, page)
+    return render_page(product_id, page)
+
+def fingerprint(product_ids, directory=None):
+    # Return a hash of every page of the products. Results of benchmarks are comparable only if the pages were the same.
+    digest = hashlib.sha256()
+    for product_id in product_ids:
+        page = 1
+        while (html := get_page(directory, product_id, page)) is not None:
+            digest.update(html.encode("UTF-8"))
+            page += 1
+    return digest.hexdigest()[:16]
+
+def save_page(directory, product_id, page, html):
+    os.makedirs(os.path.join(directory, product_id), exist_ok=True)
+    # "mtime=0" leaves the time of saving out of the file, so recording the same page again creates the same file.
+    with open(page_path(directory, product_id, page), "wb") as file:
+        with gzip.GzipFile(fileobj=file, mode="wb", mtime=0) as compressed:
+            compressed.write(html.encode("UTF-8"))
+
+def record(url, product_id, directory):
+    # Download every page of the product's opinions from the website at "url", save them and return the amount of saved pages.
+    # "requests" and "bs4" are imported here, so serving the recorded pages doesn't require them.
+    import requests
+    from bs4 import BeautifulSoup
+    page_url = f"{url}/{product_id}"
+    page = 0
+    while page_url:
+        response = requests.get(page_url, timeout=30)
+        response.raise_for_status()
+        page += 1
+        save_page(directory, product_id, page, response.text)
+        # Follow the link to the next page, the same way the scraper does it.
+        next_page = BeautifulSoup(response.text, "html.parser").select_one("a.pagination__next")
+        page_url = url + next_page["href"] if next_page else None
+    return page
+
+def main():
+    parser = argparse.ArgumentParser(description="Record pages of opinions used by the benchmarks.")
+    parser.add_argument("product_ids", nargs="+", help="IDs of the recorded products")
+    parser.add_argument("--url", required=True, help="address of the website, e.g. https://www.ceneo.pl")
+    parser.add_argument("--directory", required=True, help="directory the pages are saved to")
+    arguments = parser.parse_args()
+    for product_id in arguments.product_ids:
+        print(f"{product_id}: {record(arguments.url.rstrip('/'), product_id, arguments.directory)} pages")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# opinion_storage.py compares the .json files of opinions with the binary format (app/storage.py):
+# the size on disk, the time of loading every opinion, the time of reading a single column (every opinion's stars)
+# and the time of reading a single opinion.
+#
+# Usage (in the ./CeneoWebScraper directory):
+#     python -m benchmarks.opinion_storage --opinions 50000
+# "argparse" package is used for reading command-line arguments.
+import argparse
+# "json" package is used for working with .json files.
+import json
+# "os" package is used for reading/writing to files.
+import os
+# "random" package is used for choosing the opinions read one by one.
+import random
+# "tempfile" package is used for creating a temporary directory for the saved files.
+import tempfile
+# "time" package is used for measuring how long reading takes.
+import time
+from app.exports import columns
+from app.models.product import Product
+from app.parameters import storage
+from app.storage import OpinionStore, write_opinions
+from benchmarks.opinions_memory import generate_opinions
+
+def best_time(function, repeat):
+    # Return the shortest of "repeat" run times of the function (in milliseconds).
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the .json files of opinions with the binary format.")
+    parser.add_argument("-n", "--opinions", type=int, default=50000, help="amount of opinions (default: 50000)")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="amount of runs, the best one is reported (default: 5)")
+    arguments = parser.parse_args()
+
+    opinions = generate_opinions(arguments.opinions)
+    # 100 opinions read one by one.
+    numbers = random.Random(0).sample(range(len(opinions)), min(100, len(opinions)))
+    # Product.import_product() reads files relative to the current directory, so the files are saved in a temporary "app" directory.
+    current_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            os.makedirs("app/products")
+            os.makedirs("app/opinions")
+            with open("app/products/1.json", "w", encoding="UTF-8") as jf:
+                json.dump({"product_id": "1", "product_name": "Produkt testowy", "opinions_count": len(opinions),
+                           "pros_count": 0, "cons_count": 0, "average_score": 0}, jf)
+            json_path = "app/opinions/1.json"
+            binary_path = "app/opinions/1.bin"
+            with open(json_path, "w", encoding="UTF-8") as jf:
+                json.dump(opinions, jf, indent=4, ensure_ascii=False)
+            write_opinions(binary_path, opinions, columns)
+
+            def load_json():
+                with open(json_path, "r", encoding="UTF-8") as jf:
+                    return json.load(jf)
+
+            def load_binary():
+                with OpinionStore(binary_path) as store:
+                    return list(store)
+
+            def stars_json():
+                # Every opinion has to be read to get their stars.
+                return [opinion["stars"] for opinion in load_json()]
+
+            def stars_binary():
+                with OpinionStore(binary_path) as store:
+                    return store.column("stars")
+
+            def single_json():
+                opinions = load_json()
+                return [opinions[number] for number in numbers]
+
+            def single_binary():
+                with OpinionStore(binary_path) as store:
+                    return [store[number] for number in numbers]
+
+            def import_product(binary):
+                # Load the opinions as Opinion objects, the way the app does it.
+                def load():
+                    storage["binary"] = binary
+                    product = Product("1")
+                    product.import_product()
+                    return product
+                return load
+
+            # Make sure both formats contain the same opinions.
+            assert load_binary() == opinions and stars_binary() == stars_json() and single_binary() == single_json()
+
+            sizes = {"json": os.path.getsize(json_path), "binary": os.path.getsize(binary_path)}
+            results = [
+                ("every opinion", best_time(load_json, arguments.repeat), best_time(load_binary, arguments.repeat)),
+                ("stars of every opinion", best_time(stars_json, arguments.repeat), best_time(stars_binary, arguments.repeat)),
+                (f"{len(numbers)} single opinions", best_time(single_json, arguments.repeat), best_time(single_binary, arguments.repeat)),
+                ("Product.import_product()", best_time(import_product(False), arguments.repeat), best_time(import_product(True), arguments.repeat)),
+            ]
+        finally:
+            os.chdir(current_directory)
+
+    print(f"{len(opinions)} opinions")
+    print(f"{'size on disk':<24} {sizes['json'] / 1024 / 1024:9.1f} MiB {sizes['binary'] / 1024 / 1024:9.1f} MiB")
+    print(f"{'reading':<24} {'.json':>13} {'.bin':>13}")
+    for name, json_time, binary_time in results:
+        print(f"{name:<24} {json_time:10.1f} ms {binary_time:10.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# opinions_memory.py measures the memory taken by the opinions of a large product loaded with Product.import_product(),
+# and compares it with opinions stored the way they were before (a dictionary of attributes for every object, no interned strings).
+#
+# Usage (in the ./CeneoWebScraper directory):
+#     python -m benchmarks.opinions_memory --opinions 50000
+# "argparse" package is used for reading command-line arguments.
+import argparse
+# "json" package is used for working with .json files.
+import json
+# "os" package is used for reading/writing to files.
+import os
+# "random" package is used for generating (repeatable) opinions.
+import random
+# "tempfile" package is used for creating a temporary directory for the generated product.
+import tempfile
+# "tracemalloc" package is used for measuring the memory allocated by Python.
+import tracemalloc
+from app.models.product import Product
+from benchmarks.ceneo_stub import _authors, _words, _features
+
+# The way opinions were stored before: a plain class, so every object has its own dictionary of attributes.
+class DictOpinion():
+    def __init__(self, author="", recommendation=None, stars=0, content="", useful=0, useless=0, published=None,
+                 purchased=None, pros=None, cons=None, opinion_id=""):
+        self.author = author
+        self.recommendation = recommendation
+        self.stars = stars
+        self.content = content
+        self.useful = useful
+        self.useless = useless
+        self.published = published
+        self.purchased = purchased
+        self.pros = pros
+        self.cons = cons
+        self.opinion_id = opinion_id
+
+def generate_opinions(amount):
+    # Return a list of "amount" dictionaries of opinions' attributes, in the same format as app/opinions/<product_id>.json files.
+    generator = random.Random(amount)
+    return [{
+        "opinion_id": str(10000000 + number),
+        "author": generator.choice(_authors),
+        "recommendation": generator.choice(["Polecam", "Nie polecam", None]),
+        "stars": generator.choice(["0,5/5", "1/5", "2/5", "3/5", "3,5/5", "4/5", "4,5/5", "5/5"]),
+        "content": " ".join(generator.choice(_words) for _ in range(generator.randint(5, 80))),
+        "useful": str(generator.randint(0, 50)),
+        "useless": str(generator.randint(0, 20)),
+        "published": f"2023-0{generator.randint(1, 9)}-1{generator.randint(0, 9)} 12:00:00",
+        "purchased": generator.choice(["2022-12-01 10:00:00", None]),
+        "pros": generator.sample(_features, generator.randint(0, 3)),
+        "cons": generator.sample(_features, generator.randint(0, 2))
+    } for number in range(amount)]
+
+def measure(function):
+    # Return the result of the function and the memory (in bytes) still allocated by it after it finished.
+    tracemalloc.start()
+    result = function()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, current
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory taken by the opinions of a large product.")
+    parser.add_argument("-n", "--opinions", type=int, default=50000, help="amount of opinions (default: 50000)")
+    arguments = parser.parse_args()
+
+    opinions = generate_opinions(arguments.opinions)
+    stats = {"product_id": "1", "product_name": "Produkt testowy", "opinions_count": len(opinions), "pros_count": 0, "cons_count": 0, "average_score": 0}
+    # Product.import_product() reads files relative to the current directory, so the product is saved in a temporary "app" directory.
+    current_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            os.makedirs("app/products")
+            os.makedirs("app/opinions")
+            with open("app/products/1.json", "w", encoding="UTF-8") as jf:
+                json.dump(stats, jf, ensure_ascii=False)
+            with open("app/opinions/1.json", "w", encoding="UTF-8") as jf:
+                json.dump(opinions, jf, indent=4, ensure_ascii=False)
+            del opinions
+
+            def load_slotted():
+                product = Product("1")
+                product.import_product()
+                return product
+
+            def load_dict():
+                with open("app/opinions/1.json", "r", encoding="UTF-8") as jf:
+                    return [DictOpinion(**opinion) for opinion in json.load(jf)]
+
+            product, slotted = measure(load_slotted)
+            count = len(product.opinions)
+            del product
+            _, plain = measure(load_dict)
+        finally:
+            os.chdir(current_directory)
+
+    print(f"{count} opinions")
+    print(f"before (dictionary per object): {plain / 1024 / 1024:8.1f} MiB ({plain / count:6.0f} bytes per opinion)")
+    print(f"now (slots, interned strings):  {slotted / 1024 / 1024:8.1f} MiB ({slotted / count:6.0f} bytes per opinion)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# parsing_memory.py compares the peak memory used while parsing a single page of opinions
+# by building a Beautiful Soup tree of the whole page and by the streaming parser (app/streaming.py).
+#
+# Usage (in the ./CeneoWebScraper directory):
+#     python -m benchmarks.parsing_memory                      (uses pages generated by the stand-in server)
+#     python -m benchmarks.parsing_memory saved_page.html ...  (uses saved pages)
+# "argparse" package is used for reading command-line arguments.
+import argparse
+# "time" package is used for measuring how long parsing takes.
+import time
+# "tracemalloc" package is used for measuring the memory allocated by Python.
+import tracemalloc
+from app.parameters import scraping
+from app.models.product import parse_page
+from benchmarks.ceneo_stub import render_page
+
+def measure(pages, streaming):
+    # Return the average peak memory (in bytes) and time (in seconds) of parsing a single page.
+    scraping["streaming"] = streaming
+    peaks, times = [], []
+    for html in pages:
+        tracemalloc.start()
+        start = time.perf_counter()
+        opinions, next_page = parse_page(html)
+        times.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks), sum(times) / len(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the peak memory of parsing whole pages and streaming them.")
+    parser.add_argument("pages", nargs="*", help="saved HTML pages of opinions (default: pages generated by the stand-in server)")
+    parser.add_argument("-n", "--count", type=int, default=10, help="amount of generated pages (default: 10)")
+    arguments = parser.parse_args()
+
+    if arguments.pages:
+        pages = []
+        for path in arguments.pages:
+            with open(path, "r", encoding="UTF-8") as file:
+                pages.append(file.read())
+    else:
+        pages = [render_page("999", page) for page in range(1, arguments.count + 1)]
+
+    # Parse a page with both parsers first, so the packages they import aren't counted in the results.
+    for streaming in (False, True):
+        measure(pages[:1], streaming)
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1024:.0f} KiB each on average")
+    for name, streaming in [("whole page", False), ("streaming", True)]:
+        peak, elapsed = measure(pages, streaming)
+        print(f"{name:<11} peak memory per page: {peak / 1024:8.0f} KiB, time per page: {elapsed * 1000:6.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# prefetch_check.py checks that extracting opinions with pages downloaded ahead (PagePrefetcher, the default) returns
+# the same opinions in the same order as downloading pages one after another, and that neither sends more requests
+# than the product has pages. The pages are served by the stand-in server (benchmarks/ceneo_stub.py).
+# Prints a line for every product and exits with code 1 if any check fails.
+#
+# Usage (in the ./CeneoWebScraper directory):
+#     python -m benchmarks.prefetch_check
+#     python -m benchmarks.prefetch_check 1 7 40 250
+# "argparse" package is used for reading command-line arguments.
+import argparse
+# "os" package is used for setting environment variables.
+import os
+# "sys" package is used for setting the exit code.
+import sys
+# "tempfile" package is used for creating a temporary directory the app is run in.
+import tempfile
+from benchmarks.ceneo_stub import serve_in_background, page_count
+
+def extract(server, product_id, concurrent):
+    # Extract the product's opinions and return their IDs and the amount of requests received by the server.
+    from app.models.product import Product
+    before = server.requests
+    product = Product(product_id).extract_opinions(concurrent=concurrent)
+    return [opinion.opinion_id for opinion in product.opinions], server.requests - before
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that concurrent extraction returns the same opinions as sequential extraction.")
+    parser.add_argument("product_ids", nargs="*", default=["1", "3", "12", "40", "137"], help="IDs of the checked products (default: 1 3 12 40 137)")
+    arguments = parser.parse_args()
+
+    server = serve_in_background()
+    # The parameters are read when the app is imported, so they're set before it: the stand-in server, no limit of requests
+    # per second and no cache of downloaded pages (otherwise the second extraction wouldn't send any requests).
+    os.environ.update(CENEO_URL=f"http://127.0.0.1:{server.server_port}", CENEO_RATE="0", CENEO_CACHE="0")
+    failed = False
+    current_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for product_id in arguments.product_ids:
+                sequential, sequential_requests = extract(server, product_id, concurrent=False)
+                concurrent, concurrent_requests = extract(server, product_id, concurrent=True)
+                pages = page_count(product_id)
+                problems = []
+                if concurrent != sequential:
+                    problems.append("different opinions")
+                if len(sequential) != pages * 10 or len(set(sequential)) != len(sequential):
+                    problems.append("missing or repeated opinions")
+                if sequential_requests != pages or concurrent_requests != pages:
+                    problems.append("extra requests")
+                failed = failed or bool(problems)
+                print(f"{product_id:>6}: {pages:4} pages, {len(concurrent):5} opinions, requests: {sequential_requests:4} sequential, "
+                      f"{concurrent_requests:4} concurrent  {', '.join(problems) or 'OK'}")
+        finally:
+            os.chdir(current_directory)
+            server.shutdown()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# products_page.py measures the latency of the /products page with many products in the catalogue,
+# and compares it with the way the page was created before (opening a .json file of every product).
+#
+# Usage (in the ./CeneoWebScraper directory):
+#     python -m benchmarks.products_page --products 10000
+# "argparse" package is used for reading command-line arguments.
+import argparse
+# "json" package is used for working with .json files.
+import json
+# "os" package is used for reading/writing to files.
+import os
+# "random" package is used for generating (repeatable) products.
+import random
+# "tempfile" package is used for creating a temporary directory for the generated products.
+import tempfile
+# "time" package is used for measuring how long creating the page takes.
+import time
+from flask import render_template
+from app import app
+from app.models.product import Product
+
+def generate_products(amount):
+    # Save "amount" products to the app/products directory (and empty lists of their opinions to the app/opinions directory).
+    generator = random.Random(amount)
+    os.makedirs("app/products")
+    os.makedirs("app/opinions")
+    for number in range(amount):
+        product_id = str(10000000 + number)
+        stats = {"product_id": product_id, "product_name": f"Produkt testowy {number}", "opinions_count": generator.randint(0, 500),
+                 "pros_count": generator.randint(0, 300), "cons_count": generator.randint(0, 200), "average_score": round(generator.uniform(0, 5), 2)}
+        with open(f"app/products/{product_id}.json", "w", encoding="UTF-8") as jf:
+            json.dump(stats, jf)
+        with open(f"app/opinions/{product_id}.json", "w", encoding="UTF-8") as jf:
+            jf.write("[]")
+
+def old_products_page():
+    # The /products page as it was created before the catalogue: every product's .json file is opened, every product is displayed.
+    products = []
+    for product_id in [filename.split(".")[0] for filename in os.listdir("app/opinions")]:
+        product = Product(product_id)
+        product.import_product(import_opinions=False)
+        products.append(product.stats_to_dict())
+    with app.test_request_context("/products"):
+        return render_template("products.html.jinja", products=products, query="", sort="product_id", order="asc", page=1, pages=1, total=len(products))
+
+def best_time(function, repeat):
+    # Return the shortest of "repeat" run times of the function (in milliseconds).
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the latency of the /products page.")
+    parser.add_argument("-n", "--products", type=int, default=10000, help="amount of products (default: 10000)")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="amount of runs, the best one is reported (default: 5)")
+    arguments = parser.parse_args()
+
+    # The app reads files relative to the current directory, so the products are saved in a temporary "app" directory.
+    current_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            generate_products(arguments.products)
+            client = app.test_client()
+            # The first request creates the catalogue and migrates every product to it.
+            start = time.perf_counter()
+            client.get("/products")
+            migration = (time.perf_counter() - start) * 1000
+
+            results = {
+                "before (every .json file)": best_time(old_products_page, arguments.repeat),
+                "/products (first page)": best_time(lambda: client.get("/products"), arguments.repeat),
+                "/products (last page)": best_time(lambda: client.get(f"/products?page={arguments.products // 50}"), arguments.repeat),
+                "/products (sorted by score)": best_time(lambda: client.get("/products?sort=average_score&order=desc"), arguments.repeat),
+                "/products (search)": best_time(lambda: client.get("/products?q=testowy 99"), arguments.repeat),
+            }
+        finally:
+            os.chdir(current_directory)
+
+    print(f"{arguments.products} products, migration to the catalogue: {migration:.0f} ms")
+    for name, elapsed in results.items():
+        print(f"{name:<28} {elapsed:9.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# startup.py measures how long starting the app takes and how much memory a freshly started process (worker) uses,
+# with modules imported when they're first used (the default) and with every module imported at startup (the way the app started before).
+# Every measurement is made in a new Python process, so no module is imported before the measurement starts.
+#
+# Usage (in the ./CeneoWebScraper directory):
+#     python -m benchmarks.startup
+# "argparse" package is used for reading command-line arguments.
+import argparse
+# "json" package is used for sending the results of a measurement from the measuring process.
+import json
+# "os" package is used for reading/writing to files.
+import os
+# "subprocess" package is used for starting new Python processes.
+import subprocess
+# "sys" package is used for finding the Python interpreter and the loaded modules.
+import sys
+# "tempfile" package is used for creating a temporary directory the app is started in.
+import tempfile
+# "time" package is used for measuring how long starting the app takes.
+import time
+
+# Pages requested right after starting the app.
+paths = ["/", "/author", "/products"]
+# Packages which took a long time to import. The results show which of them were imported.
+heavy_packages = ["pandas", "numpy", "matplotlib", "requests", "bs4", "openpyxl"]
+
+def rss():
+    # Return the memory used by the current process (in bytes), read from /proc/self/status on Linux.
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        pass
+    # On other systems, return the largest amount of memory used so far.
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+def measure(path, preload):
+    # Start the app, request a page and print the results as JSON. Run in a new process by run().
+    start = time.perf_counter()
+    from app import create_app
+    app = create_app(preload=preload)
+    started = time.perf_counter() - start
+    client = app.test_client()
+    start = time.perf_counter()
+    status = client.get(path).status_code
+    first_request = time.perf_counter() - start
+    print(json.dumps({"startup": started, "first_request": first_request, "status": status, "rss": rss(),
+                      "imported": [package for package in heavy_packages if package in sys.modules]}))
+
+def run(path, preload, directory):
+    # Measure in a new Python process started in "directory" and return the results.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ, PYTHONPATH=root)
+    command = [sys.executable, "-m", "benchmarks.startup", "--measure", path, "--preload", ",".join(preload)]
+    output = subprocess.run(command, cwd=directory, env=environment, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the startup time and memory of the app.")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="amount of runs, the best one is reported (default: 3)")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--preload", default="", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if arguments.measure:
+        measure(arguments.measure, [group for group in arguments.preload.split(",") if group])
+        return
+
+    # The app reads files relative to the current directory, so it's started in a temporary directory.
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'page':<10} {'imports':<10} {'startup':>10} {'request':>10} {'RSS':>10}  heavy packages imported")
+        for path in paths:
+            for name, preload in [("all", ["all"]), ("lazy", [])]:
+                results = [run(path, preload, directory) for _ in range(arguments.repeat)]
+                best = min(results, key=lambda result: result["startup"] + result["first_request"])
+                print(f"{path:<10} {name:<10} {best['startup'] * 1000:7.0f} ms {best['first_request'] * 1000:7.0f} ms "
+                      f"{best['rss'] / 1024 / 1024:6.1f} MiB  {', '.join(best['imported']) or '-'}")
+
+if __name__ == "__main__":
+    main()
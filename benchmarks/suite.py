@@ -0,0 +1,247 @@
+# suite.py runs the whole app offline against the pages served by the stand-in server (generated pages, or pages recorded
+# with benchmarks/fixtures.py) and measures every stage of extracting a product (extract_name() -> extract_opinions() -> calculate_stats() -> export_opinions()
+# -> export_product() -> draw_charts()) and the pages of the app (/products, /product/<product_id>, the downloads, ...),
+# for a small, a medium and a large (500 pages) product. The time and the memory of every stage is printed
+# and saved to a .json file, so the results of two commits can be compared. The results include a fingerprint of the served pages,
+# because results measured with different pages can't be compared.
+#
+# Usage (in the ./CeneoWebScraper directory):
+#     python -m benchmarks.suite                                  (saves the results to benchmarks/results/{commit}.json)
+#     python -m benchmarks.suite --products small,medium --repeat 1
+#     python -m benchmarks.suite --compare benchmarks/results/{older commit}.json
+#     python -m benchmarks.suite --fixtures recorded_pages        (uses recorded pages of the products which were recorded)
+# "argparse" package is used for reading command-line arguments.
+import argparse
+# "datetime" package is used for saving the time of the measurement.
+import datetime
+# "json" package is used for working with .json files.
+import json
+# "os" package is used for reading/writing to files.
+import os
+# "platform" package is used for saving the system the measurement was made on.
+import platform
+# "socket" package is used for finding a free port for the stand-in server.
+import socket
+# "subprocess" package is used for starting the stand-in server and reading the current commit.
+import subprocess
+# "sys" package is used for finding the Python interpreter.
+import sys
+# "tempfile" package is used for creating a temporary directory the app is run in.
+import tempfile
+# "time" package is used for measuring how long things take.
+import time
+# "tracemalloc" package is used for measuring the largest amount of memory allocated by every stage.
+import tracemalloc
+# "find_spec" checks if a package is installed without importing it.
+from importlib.util import find_spec
+from benchmarks.fixtures import corpus, fingerprint
+from benchmarks.startup import rss
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Stages of extracting a product, in the order they're run.
+stages = ["extract_name", "extract_opinions", "calculate_stats", "export_opinions", "export_product", "draw_charts"]
+# Downloadable formats of opinions (.parquet files require the "pyarrow" package).
+formats = ["json", "csv", "ndjson", "xlsx"] + (["parquet"] if find_spec("pyarrow") else [])
+
+def routes(product_id):
+    # Return the pages of the app requested after a product is extracted. Keys are names used in the results.
+    pages = {
+        "/products": "/products",
+        "/product/<product_id>": f"/product/{product_id}",
+        "/api/product/<product_id>/opinions": f"/api/product/{product_id}/opinions?limit=20",
+        "/api/product/<product_id>/opinions (sorted, filtered)": f"/api/product/{product_id}/opinions?limit=100&sort=-useful&filter=with_pros",
+        "/graphs/<product_id>": f"/graphs/{product_id}",
+    }
+    pages.update({f"/opinions/<product_id>.{extension}": f"/opinions/{product_id}.{extension}" for extension in formats})
+    return pages
+
+def start_server(fixtures=None):
+    # Start the stand-in server serving the generated pages (or the pages recorded in the "fixtures" directory)
+    # in a separate process, so serving pages doesn't slow down (or add memory to) the measured process.
+    # Returns the process and the server's address.
+    with socket.socket() as free_socket:
+        free_socket.bind(("127.0.0.1", 0))
+        port = free_socket.getsockname()[1]
+    command = [sys.executable, "-m", "benchmarks.ceneo_stub", "--port", str(port)] + (["--fixtures", os.path.abspath(fixtures)] if fixtures else [])
+    server = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+    # Wait until the server accepts connections.
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("The stand-in server didn't start.")
+
+def measure(function, trace):
+    # Run the function and return its result, the time it took (in seconds), the memory used by the process after it (in bytes)
+    # and the largest amount of memory allocated while it was running (in bytes, only if "trace" is True).
+    if trace:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - before if trace else None
+    return result, elapsed, rss(), peak
+
+def run_product(app, product_id, trace):
+    # Extract the product and request every page of the app once. Run in an empty directory. Returns the results of a single run.
+    from app.models.product import Product
+    product = Product(product_id)
+    steps = {
+        "extract_name": product.extract_name,
+        "extract_opinions": product.extract_opinions,
+        "calculate_stats": product.calculate_stats,
+        "export_opinions": product.export_opinions,
+        "export_product": product.export_product,
+        # Charts are drawn in the background, so wait until they're drawn.
+        "draw_charts": lambda: product.draw_charts().result(),
+    }
+    results = {"pages": 0, "opinions": 0, "stages": {}, "routes": {}}
+    for stage in stages:
+        _, elapsed, memory, peak = measure(steps[stage], trace)
+        results["stages"][stage] = {"seconds": elapsed, "rss": memory, "peak": peak}
+    results["pages"] = product.pages_fetched
+    results["opinions"] = len(product.opinions)
+
+    client = app.test_client()
+    for name, url in routes(product_id).items():
+        # The first request creates the files (e.g. the .xlsx file) or draws the charts, the second one reuses them.
+        for state in ("cold", "warm"):
+            response, elapsed, memory, peak = measure(lambda: client.get(url), trace)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}")
+            results["routes"].setdefault(name, {"bytes": len(response.get_data())})[state] = {"seconds": elapsed, "rss": memory, "peak": peak}
+            response.close()
+    return results
+
+def best(runs):
+    # Merge the results of many runs of the same product, keeping the shortest time (and the largest memory) of every measurement.
+    merged = runs[0]
+    for run in runs[1:]:
+        for stage, values in run["stages"].items():
+            merge(merged["stages"][stage], values)
+        for name, states in run["routes"].items():
+            for state in ("cold", "warm"):
+                merge(merged["routes"][name][state], states[state])
+    return merged
+
+def merge(kept, values):
+    kept["seconds"] = min(kept["seconds"], values["seconds"])
+    kept["rss"] = max(kept["rss"], values["rss"])
+    if kept["peak"] is not None:
+        kept["peak"] = max(kept["peak"], values["peak"])
+
+def git(*arguments):
+    # Return the output of a git command run in the repository (None if git isn't available).
+    try:
+        return subprocess.run(["git", *arguments], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def flatten(results):
+    # Return a dictionary of every time in the results, e.g. {"small extract_opinions": 0.5, "small /products (warm)": 0.01, ...}.
+    times = {}
+    for size, product in results["products"].items():
+        for stage, values in product["stages"].items():
+            times[f"{size} {stage}"] = values["seconds"]
+        for name, states in product["routes"].items():
+            for state in ("cold", "warm"):
+                times[f"{size} {name} ({state})"] = states[state]["seconds"]
+    return times
+
+def compare(old, new):
+    # Print the times of both results and how many times longer the new ones are (above 1 - slower, below 1 - faster).
+    old_times, new_times = flatten(old), flatten(new)
+    print(f"\nCompared with {old.get('commit') or '?'} ({old.get('created', '?')}):")
+    for size, product in new["products"].items():
+        if size in old["products"] and old["products"][size].get("pages_fingerprint") != product["pages_fingerprint"]:
+            print(f"Warning: {size} was measured with different pages, so its times may not be comparable.")
+    print(f"{'measurement':<72} {'old':>10} {'new':>10} {'ratio':>7}")
+    for name, new_time in new_times.items():
+        if name in old_times:
+            ratio = new_time / old_times[name] if old_times[name] else float("inf")
+            print(f"{name:<72} {old_times[name] * 1000:7.1f} ms {new_time * 1000:7.1f} ms {ratio:6.2f}x")
+
+def print_results(results):
+    for size, product in results["products"].items():
+        print(f"\n{size}: product {product['product_id']}, {product['pages']} pages, {product['opinions']} opinions")
+        print(f"{'stage / page':<56} {'time':>10} {'warm':>10} {'RSS':>10} {'peak':>10}")
+        for stage, values in product["stages"].items():
+            peak = f"{values['peak'] / 1024 / 1024:6.1f} MiB" if values["peak"] is not None else f"{'-':>10}"
+            print(f"{stage:<56} {values['seconds'] * 1000:7.1f} ms {'':>10} {values['rss'] / 1024 / 1024:6.1f} MiB {peak}")
+        for name, states in product["routes"].items():
+            peak = f"{states['cold']['peak'] / 1024 / 1024:6.1f} MiB" if states["cold"]["peak"] is not None else f"{'-':>10}"
+            print(f"{name:<56} {states['cold']['seconds'] * 1000:7.1f} ms {states['warm']['seconds'] * 1000:7.1f} ms "
+                  f"{states['cold']['rss'] / 1024 / 1024:6.1f} MiB {peak}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the whole app offline, using recorded pages of opinions.")
+    parser.add_argument("--products", default=",".join(corpus), help=f"measured products (default: {','.join(corpus)})")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="amount of runs, the best one is reported (default: 3)")
+    parser.add_argument("--tracemalloc", action="store_true", help="measure the memory allocated by every stage (much slower)")
+    parser.add_argument("-o", "--output", help="the .json file the results are saved to (default: benchmarks/results/{commit}.json)")
+    parser.add_argument("--compare", help="a .json file with older results to compare with")
+    parser.add_argument("--fixtures", help="directory of recorded pages (see benchmarks/fixtures.py) used instead of the generated ones")
+    arguments = parser.parse_args()
+    sizes = [size for size in arguments.products.split(",") if size]
+    for size in sizes:
+        if size not in corpus:
+            parser.error(f"unknown product: {size} (available: {', '.join(corpus)})")
+
+    if arguments.tracemalloc:
+        tracemalloc.start()
+    commit = git("rev-parse", "--short", "HEAD")
+    results = {
+        "commit": commit,
+        # True if the measured code has uncommitted changes.
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": arguments.repeat,
+        "tracemalloc": arguments.tracemalloc,
+        "fixtures": arguments.fixtures,
+        "products": {},
+    }
+    current_directory = os.getcwd()
+    server, url = start_server(arguments.fixtures)
+    try:
+        # The parameters are read when the app is imported, so they're set before it: the stand-in server, no limit of requests
+        # per second and no cache of downloaded pages (every run downloads every page).
+        os.environ.update(CENEO_URL=url, CENEO_RATE="0", CENEO_CACHE="0")
+        from app import create_app
+        # Every module is imported before the measurements, so the first stage doesn't include importing them.
+        app = create_app(preload=["all"])
+        for size in sizes:
+            runs = []
+            for _ in range(arguments.repeat):
+                # The app reads and saves files relative to the current directory, so every run starts in an empty directory.
+                with tempfile.TemporaryDirectory() as directory:
+                    os.chdir(directory)
+                    try:
+                        runs.append(run_product(app, corpus[size], arguments.tracemalloc))
+                    finally:
+                        os.chdir(current_directory)
+            results["products"][size] = dict(product_id=corpus[size], pages_fingerprint=fingerprint([corpus[size]], arguments.fixtures), **best(runs))
+    finally:
+        server.terminate()
+        server.wait()
+    # The largest memory used by the process after any stage or page.
+    results["max_rss"] = max([values["rss"] for product in results["products"].values() for values in product["stages"].values()] +
+                             [states[state]["rss"] for product in results["products"].values() for states in product["routes"].values() for state in ("cold", "warm")])
+
+    print_results(results)
+    output = arguments.output or os.path.join(ROOT, "benchmarks", "results", f"{commit or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="UTF-8") as jf:
+        json.dump(results, jf, indent=4)
+    print(f"\nSaved to {output}")
+    if arguments.compare:
+        with open(arguments.compare, "r", encoding="UTF-8") as jf:
+            compare(json.load(jf), results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# scrape.py extracts many products at once from the command line, without starting the Flask app.
+# Pages of opinions are downloaded concurrently and parsed in a pool of processes, so parsing can use every CPU core.
+#
+# Usage (in the ./CeneoWebScraper directory):
+#     python scrape.py 12345 67890
+#     python scrape.py --file product_ids.txt
+# "argparse" package is used for reading command-line arguments.
+import argparse
+# "time" package is used for measuring how long the extraction takes.
+import time
+# "threading" package is used for synchronizing access to objects shared between threads.
+import threading
+# "ThreadPoolExecutor" runs functions in a pool of threads, "ProcessPoolExecutor" runs functions in a pool of processes.
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+# Import the Product class and the function parsing a single page of opinions from the app/models directory.
+from app.models.product import Product, parse_page
+from app import scraper
+
+# A dictionary of counters describing the whole run. "parsing" is the total time spent parsing pages (in seconds).
+totals = {"products": 0, "pages": 0, "opinions": 0, "parsing": 0.0}
+totals_lock = threading.Lock()
+
+def timed_parse_page(html):
+    # Parse a single page of opinions (in a worker process) and return the result together with the time it took.
+    start = time.perf_counter()
+    result = parse_page(html)
+    return result, time.perf_counter() - start
+
+def read_product_ids(arguments):
+    # Return a list of product IDs passed as arguments and found in the passed file (one ID per line, empty lines are skipped).
+    product_ids = list(arguments.product_ids)
+    if arguments.file:
+        with open(arguments.file, "r", encoding="UTF-8") as file:
+            product_ids += [line.strip() for line in file if line.strip()]
+    return product_ids
+
+def scrape_product(product_id, processes, incremental):
+    # Extract a single product, parsing its pages in the "processes" pool.
+    def parse(html):
+        result, elapsed = processes.submit(timed_parse_page, html).result()
+        with totals_lock:
+            totals["parsing"] += elapsed
+        return result
+
+    product = Product(product_id)
+    product.extract_name()
+    # If the product name does NOT exist, the product ID doesn't point to an actual product on the scraped website.
+    if not product.product_name:
+        print(f"{product_id}: product does not exist, skipped")
+        return
+    # The incremental extraction updates the statistics while adding the new opinions to the stored ones.
+    if incremental:
+        product.extract_new_opinions(parse=parse)
+    else:
+        product.extract_opinions(parse=parse).calculate_stats()
+    # Save the product's opinions and information to .json files.
+    product.export_opinions()
+    product.export_product()
+    # Draw the charts in the background, while the next product is extracted.
+    product.draw_charts()
+
+    with totals_lock:
+        totals["products"] += 1
+        totals["pages"] += product.pages_fetched
+        totals["opinions"] += product.opinions_extracted
+    # The incremental extraction also keeps the stored opinions, which weren't downloaded again.
+    stored = f" ({len(product.opinions)} in total)" if incremental else ""
+    print(f"{product_id}: {product.opinions_extracted} opinions from {product.pages_fetched} pages{stored}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract opinions about many products from ceneo.pl.")
+    parser.add_argument("product_ids", nargs="*", help="IDs of the products to extract")
+    parser.add_argument("-f", "--file", help="a file with product IDs, one per line")
+    parser.add_argument("-p", "--products", type=int, default=4, help="amount of products extracted at the same time (default: 4)")
+    parser.add_argument("-i", "--incremental", action="store_true", help="download only the opinions posted since the last extraction")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="amount of processes parsing pages (default: amount of CPU cores)")
+    arguments = parser.parse_args()
+
+    product_ids = read_product_ids(arguments)
+    if not product_ids:
+        parser.error("no product IDs were given")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=arguments.workers) as processes, ThreadPoolExecutor(max_workers=arguments.products) as threads:
+        futures = {product_id: threads.submit(scrape_product, product_id, processes, arguments.incremental) for product_id in product_ids}
+        for product_id, future in futures.items():
+            # Report a failed product without stopping the others.
+            try:
+                future.result()
+            except Exception as error:
+                print(f"{product_id}: failed ({type(error).__name__}: {error})")
+    elapsed = time.perf_counter() - start
+
+    # Print a summary of the throughput. Network and parsing times are summed over every thread and process,
+    # so they can be longer than the total time.
+    print()
+    print(f"Total time:    {elapsed:.2f} s")
+    print(f"Products:      {totals['products']} ({totals['products'] / elapsed:.2f}/s)")
+    print(f"Pages:         {totals['pages']} ({totals['pages'] / elapsed:.2f}/s)")
+    print(f"Opinions:      {totals['opinions']} ({totals['opinions'] / elapsed:.2f}/s)")
+    print(f"Network time:  {scraper.stats['seconds']:.2f} s ({scraper.stats['requests']} requests, {scraper.stats['bytes'] / 1024 / 1024:.2f} MiB)")
+    print(f"Parsing time:  {totals['parsing']:.2f} s")
+    print(f"Retries:       {scraper.stats['retries']} ({scraper.stats['throttled']} throttled, {scraper.stats['failures']} failed, {scraper.stats['timeouts']} timed out), "
+          f"circuit breaker opened {scraper.stats['circuit_opened']} times")
+    if scraper.response_cache:
+        cache_stats = scraper.response_cache.stats
+        print(f"Cache:         {cache_stats['hits']} hits, {cache_stats['revalidations']} revalidations, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions")
+
+# Run main() only when the file is run as a script, not when it's imported (e.g. by a worker process).
+if __name__ == "__main__":
+    main()